@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Benchmarks reproducibles (sin red) de las rutas críticas
+- prepare: AudioProcessor.prepare_for_transcription
+- split: AudioProcessor.split_large_audio (probe, búsqueda de silencio y exportación)
+- stitch: unión de transcripciones por chunks con solapamiento
+- pipeline: TranscriptionPipeline completo con un backend simulado (latencia configurable),
+  en memoria o por HTTP contra mock_server.py (cliente compartido con pool de conexiones)
+
+Cada caso se ejecuta en un proceso aparte para medir su pico de memoria (RSS) sin
+arrastrar el de los casos anteriores. Los resultados se guardan en benchmarks/results/
+y se pueden comparar con una ejecución anterior para detectar regresiones.
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --only split --compare benchmarks/results/<anterior>.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from config import Config
+from synthetic_audio import generate_audio
+
+AUDIO_DIR = BENCH_DIR / ".audio"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Variación (fracción) a partir de la cual --compare marca una regresión
+DEFAULT_THRESHOLD = 0.15
+
+
+def build_cases(quick=False):
+    """Lista de casos: {"name", "kind", "params"}"""
+    minutes = [5] if quick else [10, 60]
+    long_minutes = minutes[-1]
+    # En modo rápido se baja el límite por chunk para que los audios cortos también se dividan
+    max_chunk_sec = 120 if quick else None
+    cases = []
+    for audio_format in ("aac", "m4a"):
+        cases.append({"name": f"prepare_{audio_format}_{long_minutes}min", "kind": "prepare",
+                      "params": {"format": audio_format, "minutes": long_minutes}})
+    for audio_format in ("mp3", "m4a", "flac", "wav"):
+        for length in minutes:
+            cases.append({"name": f"split_{audio_format}_{length}min", "kind": "split",
+                          "params": {"format": audio_format, "minutes": length, "max_chunk_sec": max_chunk_sec}})
+    # Con solapamiento el corte es por tiempo y las costuras se deduplican al unir
+    cases.append({"name": f"split_mp3_{long_minutes}min_overlap", "kind": "split",
+                  "params": {"format": "mp3", "minutes": long_minutes, "overlap_sec": 5,
+                             "max_chunk_sec": max_chunk_sec}})
+    for diarized in (False, True):
+        label = "diarized" if diarized else "text"
+        cases.append({"name": f"stitch_{label}_8h", "kind": "stitch",
+                      "params": {"diarized": diarized, "chunks": 24, "chunk_sec": 1200, "overlap_sec": 5}})
+    files = 2 if quick else 4
+    for transport in ("stub", "http"):
+        suffix = "" if transport == "stub" else "_http"
+        cases.append({"name": f"pipeline_{files}x{long_minutes}min{suffix}", "kind": "pipeline",
+                      "params": {"format": "mp3", "minutes": long_minutes, "files": files, "latency_sec": 0.5,
+                                 "max_chunk_sec": max_chunk_sec, "transport": transport,
+                                 "models": ["gpt-4o-transcribe", "gpt-4o-transcribe-diarize"]}})
+    return cases
+
+
+def _audio_for(params):
+    return generate_audio(AUDIO_DIR, params["minutes"], params["format"])
+
+
+def _apply_limits(params):
+    """Aplica los límites del caso a Config (el proceso del caso es desechable)"""
+    if params.get("max_chunk_sec"):
+        Config.MAX_CHUNK_DURATION_SEC = params["max_chunk_sec"]
+    Config.CHUNK_OVERLAP_SEC = params.get("overlap_sec", 0)
+
+
+def run_prepare(params):
+    from audio_processor import AudioProcessor
+    audio_processor = AudioProcessor()
+    audio_processor.prepare_for_transcription(_audio_for(params))
+    audio_processor.cleanup_work_dir()
+    return {"audio_sec": params["minutes"] * 60, "timings": audio_processor.timings}
+
+
+def run_split(params):
+    from audio_processor import AudioProcessor
+    _apply_limits(params)
+    audio_processor = AudioProcessor()
+    chunks = audio_processor.split_large_audio(_audio_for(params))
+    chunk_bytes = sum(chunk["audio"].size for chunk in chunks) if len(chunks) > 1 else 0
+    audio_processor.cleanup_work_dir()
+    return {"audio_sec": params["minutes"] * 60, "chunks": len(chunks), "chunk_bytes": chunk_bytes,
+            "timings": audio_processor.timings}
+
+
+def _synthetic_results(diarized, chunks, chunk_sec, overlap_sec):
+    """Resultados por chunk como los devolvería la API: cada chunk repite el final del anterior"""
+    words_per_sec = 2.5
+    vocabulary = ["palabra%d" % i for i in range(997)]
+    results = []
+    for index in range(chunks):
+        start_sec = max(0.0, index * chunk_sec - overlap_sec) if index else 0.0
+        end_sec = (index + 1) * chunk_sec
+        first_word = int(start_sec * words_per_sec)
+        n_words = int((end_sec - start_sec) * words_per_sec)
+        words = [vocabulary[(first_word + i) % len(vocabulary)] for i in range(n_words)]
+        if not diarized:
+            results.append({"text": " ".join(words)})
+            continue
+        per_segment = 25
+        results.append({"segments": [
+            {"speaker": "AB"[(i // per_segment) % 2], "start": start_sec + i / words_per_sec,
+             "end": start_sec + (i + per_segment) / words_per_sec, "text": " ".join(words[i:i + per_segment])}
+            for i in range(0, n_words, per_segment)
+        ]})
+    return results
+
+
+def run_stitch(params):
+    from stitcher import stitch_results
+    results = _synthetic_results(params["diarized"], params["chunks"], params["chunk_sec"], params["overlap_sec"])
+    started = time.perf_counter()
+    merged = stitch_results(results, overlap_sec=params["overlap_sec"])
+    stitch_sec = time.perf_counter() - started
+    segments = len(merged["segments"]) if "segments" in merged else 1
+    # Solo cuenta la unión, no la generación de los resultados sintéticos
+    return {"wall_sec": stitch_sec, "audio_sec": params["chunks"] * params["chunk_sec"], "chunks": params["chunks"],
+            "segments": segments, "timings": {"stitch": stitch_sec}}
+
+
+def run_pipeline(params):
+    from audio_processor import AudioProcessor
+    from openai_service import OpenAITranscriptionService
+    from pipeline import TranscriptionPipeline
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    server = None
+    try:
+        input_dir = work_dir / "input"
+        input_dir.mkdir()
+        source = _audio_for(params)
+        for i in range(params["files"]):
+            # Enlaces al mismo audio: el pipeline los trata como archivos distintos
+            (input_dir / f"audio_{i:02d}{source.suffix}").symlink_to(source)
+
+        Config.set_output_dir(work_dir / "outputs")
+        Config.CACHE_ENABLED = False
+        _apply_limits(params)
+        audio_processor = AudioProcessor(input_dir, Config.OUTPUT_DIR)
+        if params.get("transport") == "http":
+            from api_client import OpenAIBackend
+            from mock_server import MockAPIServer
+            server = MockAPIServer(("127.0.0.1", 0), latency_sec=params["latency_sec"])
+            server.start_in_thread()
+            Config.OPENAI_BASE_URL = server.base_url
+            backend = OpenAIBackend()
+        else:
+            from stub_service import StubBackend
+            backend = StubBackend(latency_sec=params["latency_sec"])
+        service = OpenAITranscriptionService(backend=backend)
+        models = [(model, model) for model in params["models"]]
+        pipeline = TranscriptionPipeline(audio_processor, service, models)
+        stats = pipeline.run(audio_processor.get_audio_files())
+        if stats["failed"]:
+            raise Exception(f"{stats['failed']} transcripción(es) fallaron")
+
+        totals = pipeline.metrics.totals()
+        result = {"audio_sec": totals["audio_sec"], "chunks": sum(f.num_chunks for f in pipeline.metrics.files),
+                  "requests": totals["requests"], "realtime_factor": totals["realtime_factor"],
+                  "timings": totals["stage_sec"]}
+        if server is not None:
+            # Conexiones TCP abiertas: con keep-alive deberían ser ~la concurrencia, no una por petición
+            result["connections"] = server.snapshot()["connections"]
+        return result
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+RUNNERS = {"prepare": run_prepare, "split": run_split, "stitch": run_stitch, "pipeline": run_pipeline}
+
+
+def _peak_rss_mb(who):
+    """Pico de RSS en MB (ru_maxrss está en KB en Linux y en bytes en macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case_in_process(case):
+    """Ejecuta un caso en este proceso e imprime el resultado en JSON (modo --run-case)"""
+    started = time.perf_counter()
+    result = RUNNERS[case["kind"]](case["params"])
+    result.setdefault("wall_sec", time.perf_counter() - started)
+    result["peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF)
+    # ffmpeg y los procesos de decodificación del pipeline
+    result["children_peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps(result))
+
+
+def run_case(case, repeat):
+    """Ejecuta un caso repeat veces en procesos nuevos; se queda con el menor tiempo y el mayor RSS"""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, "--run-case", json.dumps(case)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        if output.returncode != 0:
+            raise Exception(output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "caso fallido")
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    best = min(runs, key=lambda run: run["wall_sec"])
+    best["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    best["children_peak_rss_mb"] = max(run["children_peak_rss_mb"] for run in runs)
+    best["wall_sec_runs"] = [round(run["wall_sec"], 4) for run in runs]
+    return best
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BENCH_DIR, text=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Compara tiempo y memoria con una ejecución anterior.
+
+    Returns:
+        Lista de nombres de casos con regresión
+    """
+    baseline = {case["name"]: case for case in json.loads(Path(baseline_path).read_text())["cases"]}
+    print(f"\n📊 Comparación con {Path(baseline_path).name} (umbral {threshold:.0%})")
+    regressions = []
+    for case in results["cases"]:
+        previous = baseline.get(case["name"])
+        if previous is None or "error" in case or "error" in previous:
+            continue
+        flags = []
+        for key in ("wall_sec", "peak_rss_mb"):
+            if previous[key] and (case[key] - previous[key]) / previous[key] > threshold:
+                flags.append(key)
+        change = (case["wall_sec"] - previous["wall_sec"]) / previous["wall_sec"] if previous["wall_sec"] else 0
+        rss_change = ((case["peak_rss_mb"] - previous["peak_rss_mb"]) / previous["peak_rss_mb"]
+                      if previous["peak_rss_mb"] else 0)
+        marker = "⚠️ " if flags else "  "
+        print(f"   {marker}{case['name']:<32} tiempo {change:+.0%}  RSS {rss_change:+.0%}")
+        if flags:
+            regressions.append(case["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline del transcriptor")
+    parser.add_argument("--quick", action="store_true", help="Audios cortos y menos archivos")
+    parser.add_argument("--only", nargs="+", choices=sorted(RUNNERS), help="Ejecutar solo estos tipos de caso")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso (se toma la más rápida)")
+    parser.add_argument("--output", help="Ruta del JSON de resultados (por defecto: benchmarks/results/)")
+    parser.add_argument("--compare", metavar="JSON", help="Resultados anteriores con los que comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Variación que se considera regresión (0.15 = 15%%)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case_in_process(json.loads(args.run_case))
+        return
+
+    cases = [case for case in build_cases(args.quick) if not args.only or case["kind"] in args.only]
+
+    # Generar los audios antes de medir (se reutilizan entre ejecuciones)
+    for case in cases:
+        if "format" in case["params"]:
+            generate_audio(AUDIO_DIR, case["params"]["minutes"], case["params"]["format"])
+
+    results = {
+        "revision": _git_revision(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "cases": [],
+    }
+    print(f"⏱️  {len(cases)} caso(s), {args.repeat} repetición(es) cada uno")
+    for case in cases:
+        try:
+            result = run_case(case, args.repeat)
+            print(f"   • {case['name']:<32} {result['wall_sec']:8.3f}s  RSS {result['peak_rss_mb']:6.1f}MB"
+                  f"  ffmpeg/hijos {result['children_peak_rss_mb']:6.1f}MB"
+                  + (f"  {result['chunks']} chunk(s)" if "chunks" in result else ""))
+        except Exception as e:
+            print(f"   ❌ {case['name']}: {str(e)}")
+            result = {"error": str(e)}
+        results["cases"].append({"name": case["name"], "kind": case["kind"], "params": case["params"], **result})
+
+    output_path = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d_%H%M%S}_{results['revision']}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"💾 Resultados: {output_path}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"⚠️  {len(regressions)} regresión(es): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
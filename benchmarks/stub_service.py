@@ -0,0 +1,58 @@
+"""
+Backend de transcripción simulado para benchmarks sin red ni HTTP
+Con OpenAITranscriptionService(backend=StubBackend()) se conservan la concurrencia, los
+reintentos y las métricas del servicio real; solo la llamada a la API lee el archivo,
+espera y devuelve texto sintético
+"""
+
+import time
+from types import SimpleNamespace
+from api_client import TranscriptionBackend
+
+# Bytes por segundo de audio del stub para estimar cuántas palabras devolver (64 kbps)
+_BYTES_PER_AUDIO_SEC = 8000
+_WORDS_PER_SEC = 2.5
+_VOCABULARY = ("entonces", "bueno", "la", "entrevista", "sobre", "el", "proyecto", "que", "hicimos",
+               "durante", "año", "pasado", "con", "equipo", "de", "investigación", "y", "resultados")
+
+
+class StubBackend(TranscriptionBackend):
+    """Imita la API de transcripción con latencia configurable"""
+
+    def __init__(self, latency_sec=0.5, upload_mbps=20.0):
+        """
+        Args:
+            latency_sec: Tiempo fijo de respuesta de la API por petición
+            upload_mbps: Ancho de banda simulado de subida (0 = instantáneo)
+        """
+        self.latency_sec = latency_sec
+        self.upload_mbps = upload_mbps
+
+    def transcribe(self, model, file, response_format, **kwargs):
+        size = len(file.read())
+        upload_sec = size * 8 / (self.upload_mbps * 1000000) if self.upload_mbps else 0.0
+        time.sleep(self.latency_sec + upload_sec)
+
+        audio_sec = size / _BYTES_PER_AUDIO_SEC
+        n_words = max(1, int(audio_sec * _WORDS_PER_SEC))
+        words = [_VOCABULARY[i % len(_VOCABULARY)] for i in range(n_words)]
+        if "diarize" not in model:
+            return SimpleNamespace(text=" ".join(words))
+
+        # Un segmento cada ~10 s, alternando dos speakers
+        segments = []
+        per_segment = int(10 * _WORDS_PER_SEC)
+        for i in range(0, n_words, per_segment):
+            start = i / _WORDS_PER_SEC
+            segments.append(SimpleNamespace(
+                speaker="A" if (i // per_segment) % 2 == 0 else "B",
+                start=start,
+                end=min(audio_sec, start + 10),
+                text=" ".join(words[i:i + per_segment]),
+            ))
+        return SimpleNamespace(segments=segments)
+
+    def complete(self, model, messages, **kwargs):
+        time.sleep(self.latency_sec)
+        message = SimpleNamespace(role="assistant", content="[A] (0s-0s): Respuesta simulada.")
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
@@ -0,0 +1,100 @@
+"""
+Audio sintético con aspecto de voz para los benchmarks
+Ráfagas armónicas moduladas a ritmo de sílaba separadas por pausas con ruido de fondo.
+Es determinista (semilla fija), así los resultados son comparables entre versiones
+"""
+
+import subprocess
+import wave
+from pathlib import Path
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_RATE = 16000
+
+# Formato -> argumentos de ffmpeg para codificar desde WAV (None = WAV tal cual)
+ENCODINGS = {
+    "wav": None,
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+    "m4a": ["-c:a", "aac", "-b:a", "64k", "-f", "ipod"],
+    "aac": ["-c:a", "aac", "-b:a", "64k", "-f", "adts"],
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    "ogg": ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"],
+}
+
+# Ruido de fondo (~-60 dBFS) para que los silencios no sean ceros perfectos
+NOISE_FLOOR = 0.001
+
+
+def _utterance(rng, n_samples, sample_rate):
+    """Tono con armónicos y f0 variable, modulado en amplitud a ritmo de sílaba (3-6 Hz)"""
+    t = np.arange(n_samples) / sample_rate
+    f0 = rng.uniform(100, 250) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(0.2, 1.0) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    harmonics = sum(np.sin(k * phase) / k for k in range(1, 5))
+    syllables = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3, 6) * t))
+    return harmonics * syllables * rng.uniform(0.15, 0.4)
+
+
+def speech_like_blocks(duration_sec, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    Genera el audio por bloques (una frase o una pausa), sin tenerlo entero en memoria.
+
+    Yields:
+        Arrays int16 mono
+    """
+    rng = np.random.default_rng(seed)
+    remaining = int(duration_sec * sample_rate)
+    speaking = True
+    while remaining > 0:
+        seconds = rng.uniform(1.0, 8.0) if speaking else rng.uniform(0.2, 2.0)
+        n_samples = min(remaining, int(seconds * sample_rate))
+        block = _utterance(rng, n_samples, sample_rate) if speaking else np.zeros(n_samples)
+        block = block + rng.normal(0, NOISE_FLOOR, n_samples)
+        yield (np.clip(block, -1, 1) * 32767).astype(np.int16)
+        remaining -= n_samples
+        speaking = not speaking
+
+
+def write_wav(path, duration_sec, seed=0, sample_rate=SAMPLE_RATE):
+    """Escribe un WAV mono de 16 bits con audio sintético"""
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for block in speech_like_blocks(duration_sec, seed=seed, sample_rate=sample_rate):
+            wav.writeframes(block.tobytes())
+
+
+def generate_audio(audio_dir, minutes, audio_format, seed=0):
+    """
+    Devuelve la ruta de un audio sintético, generándolo solo si no existe.
+
+    Args:
+        audio_dir: Directorio donde se guardan los audios generados (se reutilizan entre ejecuciones)
+        minutes: Duración en minutos
+        audio_format: Clave de ENCODINGS
+    """
+    audio_dir = Path(audio_dir)
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    path = audio_dir / f"synthetic_{minutes:g}min_s{seed}.{audio_format}"
+    if path.exists():
+        return path
+
+    wav_path = audio_dir / f"synthetic_{minutes:g}min_s{seed}.wav"
+    if not wav_path.exists():
+        tmp_path = wav_path.with_suffix(".wav.tmp")
+        write_wav(tmp_path, minutes * 60, seed=seed)
+        tmp_path.replace(wav_path)
+
+    encoding = ENCODINGS[audio_format]
+    if encoding is None:
+        return wav_path
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    command = [AudioSegment.converter, "-v", "error", "-y", "-i", str(wav_path)] + encoding + [str(tmp_path)]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg falló: {result.stderr.decode(errors='ignore').strip()}")
+    tmp_path.replace(path)
+    return path
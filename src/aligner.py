@@ -0,0 +1,112 @@
+"""
+Alineador local de transcripciones (sin API)
+Traslada speakers y timestamps de la diarización al texto de la transcripción standard
+mediante alineación de palabras por bloques (difflib en una banda alrededor de la diagonal)
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+# Palabras de diarización alineadas por bloque
+BLOCK_WORDS = 400
+# Holgura (en palabras) de la banda en el texto standard
+BAND_WORDS = 200
+
+_WORD = re.compile(r"\S+")
+_WORD_CLEANUP = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _normalize(word):
+    """Minúsculas, sin puntuación ni tildes: "Cuéntame," y "cuentame" son la misma palabra"""
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return _WORD_CLEANUP.sub("", "".join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def _assign_segments(std_norm, diar_norm, diar_owner):
+    """
+    Asigna a cada palabra standard el índice del segmento diarizado al que corresponde.
+
+    Returns:
+        Lista con un índice de segmento (o None si no se pudo alinear) por palabra standard
+    """
+    assigned = [None] * len(std_norm)
+    ratio = len(std_norm) / max(len(diar_norm), 1)
+    std_pos = 0
+
+    for block_start in range(0, len(diar_norm), BLOCK_WORDS):
+        block_end = min(block_start + BLOCK_WORDS, len(diar_norm))
+        band_end = min(len(std_norm), std_pos + int((block_end - block_start) * ratio) + BAND_WORDS)
+
+        matcher = SequenceMatcher(None, diar_norm[block_start:block_end], std_norm[std_pos:band_end], autojunk=False)
+        last_matched = None
+        for a, b, size in matcher.get_matching_blocks():
+            for k in range(size):
+                assigned[std_pos + b + k] = diar_owner[block_start + a + k]
+                last_matched = std_pos + b + k
+
+        if last_matched is not None:
+            std_pos = last_matched + 1
+        else:
+            # Bloque sin coincidencias: avanzar por proporción
+            std_pos = min(len(std_norm), std_pos + int((block_end - block_start) * ratio))
+
+    # Palabras sin alinear heredan el segmento de la palabra anterior (o siguiente al inicio)
+    previous = next((owner for owner in assigned if owner is not None), None)
+    for i, owner in enumerate(assigned):
+        if owner is None:
+            assigned[i] = previous
+        else:
+            previous = owner
+    return assigned
+
+
+def align_transcripts(standard_text, segments):
+    """
+    Asigna speakers y timestamps de la diarización al texto standard y agrupa
+    las palabras consecutivas del mismo speaker en un párrafo.
+
+    Args:
+        standard_text: Transcripción standard (mejor redacción, sin speakers)
+        segments: Segmentos diarizados [{"speaker", "start", "end", "text"}, ...]
+
+    Returns:
+        Lista de intervenciones [{"speaker", "start", "end", "text"}, ...]
+    """
+    std_matches = list(_WORD.finditer(standard_text))
+    if not segments or not std_matches:
+        return []
+
+    std_norm = [_normalize(match.group()) for match in std_matches]
+    diar_norm = []
+    diar_owner = []
+    for seg_index, segment in enumerate(segments):
+        for word in segment["text"].split():
+            diar_norm.append(_normalize(word))
+            diar_owner.append(seg_index)
+
+    assigned = _assign_segments(std_norm, diar_norm, diar_owner)
+    if assigned[0] is None:
+        # Ninguna palabra alineada: todo al primer segmento
+        assigned = [0] * len(std_norm)
+
+    turns = []
+    for match, seg_index in zip(std_matches, assigned):
+        segment = segments[seg_index]
+        if turns and turns[-1]["speaker"] == segment["speaker"]:
+            turn = turns[-1]
+            turn["start"] = min(turn["start"], segment["start"])
+            turn["end"] = max(turn["end"], segment["end"])
+            turn["words"].append(match.group())
+        else:
+            turns.append({
+                "speaker": segment["speaker"],
+                "start": segment["start"],
+                "end": segment["end"],
+                "words": [match.group()],
+            })
+
+    return [
+        {"speaker": turn["speaker"], "start": turn["start"], "end": turn["end"], "text": " ".join(turn["words"])}
+        for turn in turns
+    ]
@@ -0,0 +1,86 @@
+"""
+Backends de la API de transcripción
+Un único cliente HTTP compartido por proceso (pool de conexiones keep-alive) con timeouts,
+reintentos y URL base configurables. Con OPENAI_BASE_URL se puede apuntar a cualquier
+servidor compatible, por ejemplo el servidor local de mock_server.py
+"""
+
+import threading
+from abc import ABC, abstractmethod
+import openai
+from openai import OpenAI, DefaultHttpxClient, Timeout
+from config import Config
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente OpenAI compartido (se crea la primera vez que se pide)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _build_client()
+        return _client
+
+
+def reset_client():
+    """Descarta el cliente compartido (p. ej. tras cambiar la configuración)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def _build_client():
+    api_key = Config.OPENAI_API_KEY
+    if not api_key:
+        if not Config.OPENAI_BASE_URL:
+            raise ValueError("OPENAI_API_KEY no encontrada en las variables de entorno")
+        # Un servidor local compatible no valida la clave
+        api_key = "local"
+
+    # Límites con el tipo del cliente HTTP que usa el SDK (sin depender de qué paquete lo provee)
+    limits_type = type(openai.DEFAULT_CONNECTION_LIMITS)
+    http_client = DefaultHttpxClient(
+        timeout=Timeout(Config.API_TIMEOUT_SEC, connect=Config.API_CONNECT_TIMEOUT_SEC),
+        limits=limits_type(
+            max_connections=Config.API_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.API_MAX_CONNECTIONS,
+            keepalive_expiry=Config.API_KEEPALIVE_SEC,
+        ),
+    )
+    # Los reintentos de transcripción los gestiona el servicio (backoff con Retry-After)
+    return OpenAI(api_key=api_key, base_url=Config.OPENAI_BASE_URL or None, max_retries=0, http_client=http_client)
+
+
+class TranscriptionBackend(ABC):
+    """
+    Interfaz de backend: recibe los mismos parámetros que la API de OpenAI
+    y devuelve objetos con los mismos atributos (text, segments, choices).
+    Un backend incompleto falla al crearlo, no a mitad de una ejecución
+    """
+
+    @abstractmethod
+    def transcribe(self, **params):
+        """Transcripción de audio (audio.transcriptions.create)"""
+
+    @abstractmethod
+    def complete(self, **params):
+        """Respuesta del LLM (chat.completions.create)"""
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """API de OpenAI (o compatible vía OPENAI_BASE_URL) sobre el cliente compartido"""
+
+    def __init__(self, client=None):
+        self.client = client or get_client()
+
+    def transcribe(self, **params):
+        return self.client.audio.transcriptions.create(**params)
+
+    def complete(self, **params):
+        # Las llamadas al LLM no pasan por el backoff del servicio: reintenta el SDK
+        client = self.client.with_options(max_retries=Config.RATE_LIMIT_MAX_RETRIES)
+        return client.chat.completions.create(**params)
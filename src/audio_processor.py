@@ -1,24 +1,135 @@
+import math
 import os
+import numpy as np
+import subprocess
 from pathlib import Path
 from pydub import AudioSegment
-import tempfile
+from pydub.utils import mediainfo_json
+from scratch import AudioBuffer, ScratchSpace, remove_dir
+from silence_detector import energy_envelope, envelope_from_samples, find_quietest_point, speech_regions
+from stitcher import OffsetMap
+from metrics import timed
+from config import Config
+
+# Extensiones de audio que se procesan
+SUPPORTED_EXTENSIONS = (".m4a", ".mp3", ".wav", ".flac", ".aac", ".ogg", ".mp4")
+
+# Resolución de la envolvente de energía para buscar cortes
+SILENCE_FRAME_MS = 10
+
+# Formato de decodificación para analizar silencios (suficiente para voz)
+ANALYSIS_SAMPLE_RATE = 16000
+
+# Códecs que la API acepta tal cual: se cortan con copia de stream (sin recodificar)
+# codec -> (argumentos de códec, muxer de ffmpeg, extensión)
+STREAM_COPY = ["-c:a", "copy"]
+PASSTHROUGH_CODECS = {
+    "mp3": (STREAM_COPY, "mp3", "mp3"),
+    "aac": (STREAM_COPY, "ipod", "m4a"),
+    # Copiar el stream flac conserva la STREAMINFO del origen (duración y número de muestras del
+    # archivo completo): se recodifica sin pérdida para que ffmpeg escriba una cabecera nueva
+    "flac": (["-c:a", "flac"], "flac", "flac"),
+    "opus": (STREAM_COPY, "ogg", "ogg"),
+    "vorbis": (STREAM_COPY, "ogg", "ogg"),
+}
+
+# Argumentos de muxer en toda exportación: ogg pone un número de serie aleatorio al stream
+# y el mismo chunk cambiaría de bytes (y de clave en la caché) en cada ejecución
+MUXER_ARGS = {
+    "ogg": ["-fflags", "+bitexact"],
+}
+
+# Muxers que necesitan salida con seek; a un pipe se escriben en MP4 fragmentado
+PIPE_MUXER_ARGS = {
+    "ipod": ["-movflags", "frag_keyframe+empty_moov"],
+}
+
+# Muxers que pueden escribir a un pipe. mp3 solo omite la cabecera Xing (la duración se estima
+# del bitrate; no declara una falsa). flac completa la STREAMINFO al final con seek: en un pipe
+# quedaría sin duración, así que esos chunks se escriben en el directorio de trabajo
+STREAMABLE_MUXERS = {"ogg", "mp3"}
+
+# Formatos compactos para recodificar voz: formato -> (argumentos de códec, muxer, extensión)
+SPEECH_EXPORT_FORMATS = {
+    "mp3": (["-c:a", "libmp3lame"], "mp3", "mp3"),
+    "opus": (["-c:a", "libopus", "-application", "voip"], "ogg", "ogg"),
+}
+
+
+def plan_signature(vad=False):
+    """Ajustes de los que depende el plan de división (un plan guardado solo vale con los mismos)"""
+    signature = {
+        "max_file_size_mb": Config.MAX_FILE_SIZE_MB,
+        "max_chunk_duration_sec": Config.MAX_CHUNK_DURATION_SEC,
+        "chunk_size_safety": Config.CHUNK_SIZE_SAFETY,
+        "silence_search_sec": Config.SILENCE_SEARCH_SEC,
+        "chunk_overlap_sec": Config.CHUNK_OVERLAP_SEC,
+        "chunk_export_format": Config.CHUNK_EXPORT_FORMAT,
+        "chunk_export_bitrate": Config.CHUNK_EXPORT_BITRATE,
+    }
+    if vad:
+        # Con VAD los cortes están en la línea de tiempo del audio recortado
+        signature.update(vad_min_silence_sec=Config.VAD_MIN_SILENCE_SEC,
+                         vad_keep_silence_sec=Config.VAD_KEEP_SILENCE_SEC,
+                         vad_margin_db=Config.VAD_MARGIN_DB)
+    return signature
+
+
+def parse_bitrate(bitrate):
+    """Convierte un bitrate estilo ffmpeg ("48k", "1.5M", "64000") a bits por segundo"""
+    bitrate = str(bitrate).strip().lower()
+    multipliers = {"k": 1000, "m": 1000000}
+    if bitrate and bitrate[-1] in multipliers:
+        return float(bitrate[:-1]) * multipliers[bitrate[-1]]
+    return float(bitrate)
+
 
 class AudioProcessor:
-    def __init__(self, input_dir="mp3", output_dir="outputs"):
+    def __init__(self, input_dir="mp3", output_dir="outputs", work_dir=None, media_index=None):
+        """
+        Args:
+            work_dir: Directorio para los temporales (por defecto uno nuevo en el área de trabajo,
+                      creado al necesitarlo); se borra con cleanup_work_dir()
+            media_index: MediaIndex opcional con probes, planes y envolventes ya calculados
+        """
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
+        self.work_dir = work_dir
+        self.media_index = media_index
+        # Segundos acumulados por etapa (prepare, probe, decode, silence, export)
+        self.timings = {}
+        # Bytes de chunks guardados en memoria (para el presupuesto CHUNK_MEMORY_BUDGET_MB)
+        self.buffered_bytes = 0
         
     def get_audio_files(self):
-        """Encuentra todos los archivos de audio soportados en el directorio de entrada"""
+        """Encuentra todos los archivos de audio soportados en el directorio de entrada (un solo recorrido)"""
         audio_files = []
-        supported_formats = ["*.m4a", "*.mp3", "*.wav", "*.flac", "*.aac", "*.ogg", "*.mp4"]
-        
-        if self.input_dir.exists():
-            for pattern in supported_formats:
-                audio_files.extend(self.input_dir.glob(pattern))
+        if self.input_dir.is_dir():
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        audio_files.append(Path(entry.path))
         
         return sorted(audio_files)
     
+    def order_longest_first(self, audio_files):
+        """
+        Ordena los archivos por duración, el más largo primero: empieza antes y los cortos
+        rellenan los huecos al final en lugar de dejar un único archivo largo en cola.
+        La duración sale del índice; ffprobe solo se consulta para archivos nuevos o modificados.
+        Sin hash del contenido: leer enteros los archivos nuevos retrasaría el arranque del pipeline.
+        """
+        durations = {}
+        for audio_file in audio_files:
+            try:
+                durations[audio_file] = self.probe_source(audio_file, by_content=False)["duration_sec"]
+            except Exception:
+                # Al final: el error se informa al procesarlo
+                durations[audio_file] = -1.0
+        return sorted(audio_files, key=lambda audio_file: (-durations[audio_file], audio_file.name))
+    
     def validate_audio_file(self, file_path):
         """Valida que el archivo de audio sea procesable"""
         try:
@@ -37,107 +148,415 @@ class AudioProcessor:
             if not is_valid:
                 raise Exception(f"Archivo de audio inválido: {info}")
 
-            # Convertir AAC a MP3 (OpenAI no soporta AAC directamente)
+            # OpenAI no acepta AAC crudo (ADTS): se reempaqueta en M4A sin recodificar
             if Path(file_path).suffix.lower() == '.aac':
-                print(f"   🔄 Convirtiendo AAC a MP3...")
-                audio = AudioSegment.from_file(str(file_path), format="aac")
-                temp_dir = tempfile.mkdtemp()
-                mp3_path = f"{temp_dir}/{Path(file_path).stem}.mp3"
-                audio.export(mp3_path, format="mp3", bitrate="192k")
-                return mp3_path, info  # Retorna path convertido
+                print("   🔄 Reempaquetando AAC en M4A (sin recodificar)...")
+                m4a_path = f"{self._work_dir()}/{Path(file_path).stem}.m4a"
+                with timed(self.timings, "prepare"):
+                    self._run_ffmpeg(["-i", str(file_path), "-vn", "-c:a", "copy", "-f", "ipod", m4a_path])
+                return m4a_path, info  # Retorna path convertido
 
             return str(file_path), info  # Retorna path e info
         except Exception as e:
             raise Exception(f"Error preparando audio {file_path}: {str(e)}")
     
-    def split_large_audio(self, file_path, max_size_mb=20, max_duration_sec=1300):
-        """Divide archivos de audio grandes en chunks más pequeños por tamaño Y duración"""
+    def probe_audio(self, file_path):
+        """Obtiene duración y formato con ffprobe, sin decodificar el audio"""
         try:
-            file_size_mb = Path(file_path).stat().st_size / (1024 * 1024)
+            with timed(self.timings, "probe"):
+                info = mediainfo_json(str(file_path))
+            audio_streams = [s for s in info.get("streams", []) if s.get("codec_type") == "audio"]
+            if not audio_streams:
+                raise Exception("no se encontró pista de audio")
+            stream = audio_streams[0]
+            file_format = info.get("format", {})
             
-            # Cargar audio para verificar duración
-            audio = AudioSegment.from_file(str(file_path))
-            duration_sec = len(audio) / 1000.0
-            duration_ms = len(audio)
+            duration = file_format.get("duration") or stream.get("duration")
+            if not duration:
+                raise Exception("duración desconocida")
+            bit_rate = stream.get("bit_rate") or file_format.get("bit_rate") or 0
             
-            # Verificar si necesita división por tamaño O duración
-            needs_split_size = file_size_mb > max_size_mb
-            needs_split_duration = duration_sec > max_duration_sec
+            return {
+                "duration_sec": float(duration),
+                "codec": stream.get("codec_name", ""),
+                "format_name": file_format.get("format_name", ""),
+                "sample_rate": int(stream.get("sample_rate") or 0),
+                "channels": int(stream.get("channels") or 0),
+                "bit_rate": int(float(bit_rate)),
+            }
+        except Exception as e:
+            raise Exception(f"Error analizando audio {file_path}: {str(e)}")
+    
+    def probe_source(self, file_path, by_content=True):
+        """
+        probe_audio de un archivo de entrada, desde el índice si no cambió desde la última vez.
+        
+        Args:
+            by_content: Buscar también por hash del contenido (archivo renombrado o copiado) e indexar
+                el probe. False solo consulta ruta + tamaño + mtime y no escribe en el índice:
+                el hash de un archivo nuevo se calcula después, en los procesos de decodificación
+        """
+        if self.media_index is None:
+            return self.probe_audio(file_path)
+        probe = self.media_index.get_probe(file_path, by_content)
+        if probe is None:
+            probe = self.probe_audio(file_path)
+            if by_content:
+                self.media_index.put_probe(file_path, probe)
+        return probe
+    
+    def _run_ffmpeg(self, args):
+        """Ejecuta ffmpeg y devuelve stdout; lanza excepción con el error de ffmpeg si falla"""
+        command = [AudioSegment.converter, "-v", "error", "-y"] + args
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg falló: {result.stderr.decode(errors='ignore').strip()}")
+        return result.stdout
+    
+    def _seek_args(self, start_ms, end_ms):
+        """Argumentos de seek en la entrada para leer solo [start_ms, end_ms)"""
+        return ["-ss", f"{start_ms / 1000:.3f}", "-t", f"{(end_ms - start_ms) / 1000:.3f}"]
+    
+    def decode_window(self, file_path, start_ms, end_ms, probe=None, frame_rate=None, channels=None):
+        """
+        Decodifica solo la ventana [start_ms, end_ms) con ffmpeg (seek en la entrada).
+        La memoria usada es proporcional a la ventana, no al archivo completo.
+        """
+        if frame_rate is None or channels is None:
+            probe = probe or self.probe_audio(file_path)
+            frame_rate = frame_rate or probe["sample_rate"] or 44100
+            channels = channels or probe["channels"] or 1
+        
+        data = self._run_ffmpeg(
+            self._seek_args(start_ms, end_ms) + [
+                "-i", str(file_path),
+                "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+                "-ar", str(frame_rate), "-ac", str(channels), "-",
+            ]
+        )
+        
+        return AudioSegment(
+            data=data,
+            sample_width=2,
+            frame_rate=frame_rate,
+            channels=channels,
+        )
+    
+    def stream_envelope(self, file_path, frame_ms=SILENCE_FRAME_MS, block_sec=60):
+        """
+        Envolvente de energía de todo el archivo decodificándolo en streaming (16 kHz mono).
+        La memoria es proporcional al bloque, no al archivo (la envolvente ocupa 100 valores por segundo).
+        """
+        frame_len = ANALYSIS_SAMPLE_RATE * frame_ms // 1000
+        block_bytes = frame_len * 2 * (block_sec * 1000 // frame_ms)
+        command = [AudioSegment.converter, "-v", "error", "-i", str(file_path), "-vn",
+                   "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(ANALYSIS_SAMPLE_RATE), "-ac", "1", "-"]
+        envelopes = []
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16)
+                envelopes.append(envelope_from_samples(samples, frame_len))
+            stderr = process.stderr.read()
+        if process.returncode != 0:
+            raise Exception(f"ffmpeg falló: {stderr.decode(errors='ignore').strip()}")
+        return np.concatenate(envelopes) if envelopes else np.array([], dtype=np.float32)
+    
+    def trim_silence(self, file_path, envelope=None):
+        """
+        Pre-pase VAD: genera una copia sin las pausas largas (recodificada para voz).
+        
+        Args:
+            envelope: Envolvente de todo el archivo ya calculada (p. ej. del índice)
+        
+        Returns:
+            (ruta del audio recortado, OffsetMap) o None si no hay suficiente silencio que quitar
+        """
+        with timed(self.timings, "vad"):
+            if envelope is None:
+                envelope = self.stream_envelope(file_path)
+            regions = speech_regions(
+                envelope, SILENCE_FRAME_MS,
+                min_silence_ms=Config.VAD_MIN_SILENCE_SEC * 1000,
+                keep_silence_ms=Config.VAD_KEEP_SILENCE_SEC * 1000,
+                margin_db=Config.VAD_MARGIN_DB,
+            )
+            # La envolvente no incluye el último frame incompleto
+            original_ms = len(envelope) * SILENCE_FRAME_MS
+            offset_map = OffsetMap(regions, original_ms)
+            if not regions or offset_map.removed_ms < Config.VAD_MIN_SAVING_SEC * 1000:
+                return None
             
-            if not needs_split_size and not needs_split_duration:
-                return [str(file_path)]  # No necesita división
+            # Frames de 10 ms alineados con la envolvente: aselect corta exactamente en los límites
+            selection = "+".join(f"gte(t,{start / 1000:.3f})*lt(t,{end / 1000:.3f})" for start, end in regions)
+            work_dir = self._work_dir()
+            script_path = f"{work_dir}/vad_filter.txt"
+            with open(script_path, "w") as f:
+                f.write(f"aresample={ANALYSIS_SAMPLE_RATE},aformat=channel_layouts=mono,"
+                        f"asetnsamples=n={ANALYSIS_SAMPLE_RATE * SILENCE_FRAME_MS // 1000}:p=0,"
+                        f"aselect='{selection}',asetpts=N/SR/TB")
             
-            # Mostrar razón de división
-            if needs_split_size and needs_split_duration:
-                print(f"   📂 Dividiendo archivo de {file_size_mb:.1f}MB ({duration_sec/60:.1f} min) - excede límites de tamaño y duración")
-            elif needs_split_size:
-                print(f"   📂 Dividiendo archivo de {file_size_mb:.1f}MB en chunks de ~{max_size_mb}MB")
-            else:
-                print(f"   📂 Dividiendo archivo de {duration_sec/60:.1f} min en chunks de ~{max_duration_sec/60:.1f} min")
+            codec_args, muxer, extension = SPEECH_EXPORT_FORMATS[Config.CHUNK_EXPORT_FORMAT]
+            trimmed_path = f"{work_dir}/{Path(file_path).stem}_vad.{extension}"
+            self._run_ffmpeg(
+                ["-i", str(file_path), "-vn", "-map_metadata", "-1", "-filter_script:a", script_path]
+                + codec_args + ["-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-b:a", Config.CHUNK_EXPORT_BITRATE,
+                                "-f", muxer, trimmed_path]
+            )
+            os.remove(script_path)
+        
+        print(f"   ✂️  VAD: {offset_map.removed_ms / 60000:.1f} de {original_ms / 60000:.1f} min de silencio "
+              f"eliminados ({len(regions)} región(es) con voz)")
+        return trimmed_path, offset_map
+    
+    def plan_split(self, file_path, max_size_mb=None, max_duration_sec=None, probe=None):
+        """
+        Calcula el plan de división a partir de los metadatos, sin decodificar.
+        
+        La duración máxima por chunk sale del bitrate real de salida (el de origen si se
+        copia el stream, el de recodificación si no) y del límite de subida de la API.
+        Se usa el mínimo número de chunks que cabe y se reparte la duración por igual.
+        
+        Returns:
+            Diccionario con duration_ms, mode, bitrate_bps, max_chunk_ms, num_chunks y windows nominales
+        """
+        max_size_mb = max_size_mb or Config.MAX_FILE_SIZE_MB
+        max_duration_sec = max_duration_sec or Config.MAX_CHUNK_DURATION_SEC
+        probe = probe or self.probe_audio(file_path)
+        
+        file_size = Path(file_path).stat().st_size
+        duration_sec = probe["duration_sec"]
+        duration_ms = int(duration_sec * 1000)
+        max_bytes = max_size_mb * 1024 * 1024 * Config.CHUNK_SIZE_SAFETY
+        
+        if probe["codec"] in PASSTHROUGH_CODECS:
+            # Copia de stream: los chunks conservan el bitrate de origen
+            bitrate_bps = probe["bit_rate"] or file_size * 8 / max(duration_sec, 1)
+            mode = "copia"
+        else:
+            bitrate_bps = parse_bitrate(Config.CHUNK_EXPORT_BITRATE)
+            mode = "recodificado"
+        
+        plan = {
+            "duration_ms": duration_ms,
+            "file_size_mb": file_size / (1024 * 1024),
+            "mode": mode,
+            "bitrate_bps": int(bitrate_bps),
+        }
+        
+        if file_size <= max_bytes and duration_sec <= max_duration_sec:
+            # Cabe entero: se sube el archivo tal cual
+            plan.update({"mode": "directo", "max_chunk_ms": duration_ms, "num_chunks": 1,
+                         "windows": [(0, duration_ms)]})
+            return plan
+        
+        max_chunk_sec = min(max_bytes * 8 / bitrate_bps, max_duration_sec)
+        overlap_sec = Config.CHUNK_OVERLAP_SEC
+        if overlap_sec:
+            # Con solapamiento no se busca silencio: el margen es el propio solapamiento
+            usable_sec = max(max_chunk_sec - overlap_sec, 1)
+        else:
+            # Margen para que la búsqueda de silencio pueda alargar un chunk
+            usable_sec = max(max_chunk_sec - Config.SILENCE_SEARCH_SEC / 2, 1)
+        num_chunks = max(1, math.ceil(duration_sec / usable_sec))
+        target_ms = duration_ms / num_chunks
+        
+        plan.update({
+            "max_chunk_ms": int(usable_sec * 1000) if overlap_sec else int(max_chunk_sec * 1000),
+            "num_chunks": num_chunks,
+            "windows": [
+                (max(0, int(round(i * target_ms - overlap_sec * 1000))), int(round((i + 1) * target_ms)))
+                for i in range(num_chunks)
+            ],
+        })
+        return plan
+    
+    def describe_plan(self, plan):
+        """Texto legible del plan de división (para --dry-run)"""
+        chunk_min = plan["duration_ms"] / plan["num_chunks"] / 60000
+        chunk_mb = plan["bitrate_bps"] * chunk_min * 60 / 8 / (1024 * 1024)
+        if plan["mode"] == "directo":
+            return f"1 chunk ({plan['duration_ms'] / 60000:.1f} min, {plan['file_size_mb']:.1f}MB, sin división)"
+        return (f"{plan['num_chunks']} chunks de ~{chunk_min:.1f} min (~{chunk_mb:.1f}MB c/u, "
+                f"{plan['mode']} a {plan['bitrate_bps'] / 1000:.0f} kbps)")
+    
+    def split_large_audio(self, file_path, max_size_mb=None, max_duration_sec=None, windows=None, skip_indices=(),
+                          probe=None):
+        """
+        Divide archivos de audio grandes en chunks más pequeños por tamaño Y duración.
+        La duración se obtiene con ffprobe y cada chunk se decodifica y exporta por separado,
+        así el pico de memoria no depende de la longitud del archivo.
+        
+        Args:
+            windows: Plan previo [(start_ms, end_ms), ...] a reutilizar (p. ej. al reanudar)
+            skip_indices: Índices de chunk (desde 1) que no hace falta exportar
+            probe: Resultado de probe_audio si ya se tiene (p. ej. del índice)
+        
+        Returns:
+            Lista de chunks {"index", "audio", "start_ms", "end_ms"} en orden; "audio" es un
+            AudioBuffer (None si el chunk se omite)
+        """
+        try:
+            if windows is not None:
+                return self._export_windows(file_path, windows, skip_indices, probe)
             
-            # Calcular duración por chunk considerando ambos límites
-            max_chunk_duration_ms = max_duration_sec * 1000  # Convertir a ms
+            # Plan a partir de los metadatos (sin decodificar)
+            probe = probe or self.probe_audio(file_path)
+            plan = self.plan_split(file_path, max_size_mb, max_duration_sec, probe=probe)
+            duration_ms = plan["duration_ms"]
             
-            if needs_split_size:
-                # Si es por tamaño, calcular duración basada en proporción
-                chunk_duration_by_size = int((max_size_mb / file_size_mb) * duration_ms * 0.8)
-                chunk_duration_ms = min(chunk_duration_by_size, max_chunk_duration_ms)
-            else:
-                # Si es solo por duración
-                chunk_duration_ms = max_chunk_duration_ms
+            if plan["num_chunks"] == 1:
+                # No necesita división
+                return [self._whole_file_chunk(file_path, duration_ms)]
+            
+            print(f"   📂 Dividiendo archivo de {plan['file_size_mb']:.1f}MB ({duration_ms/60000:.1f} min) "
+                  f"en {self.describe_plan(plan)}")
             
-            # Crear directorio temporal para chunks
-            temp_dir = tempfile.mkdtemp()
-            chunk_paths = []
+            max_chunk_ms = plan["max_chunk_ms"]
+            search_half_ms = Config.SILENCE_SEARCH_SEC * 1000 // 2
+            overlap_ms = int(Config.CHUNK_OVERLAP_SEC * 1000)
             
-            # Dividir en chunks
+            self.buffered_bytes = 0
+            chunks = []
+            
+            # Dividir en chunks: solo se decodifica la zona donde se busca el corte
             start = 0
             chunk_num = 1
             
             while start < duration_ms:
-                end = min(start + chunk_duration_ms, duration_ms)
-                
-                # Evitar cortar a mitad de oración - buscar silencio cerca del final
-                if end < duration_ms:
-                    # Buscar silencio en los últimos 30 segundos del chunk
-                    search_start = max(end - 30000, start + 10000)
-                    silence_thresh = audio[search_start:end].dBFS - 16
-                    
-                    # Buscar momento de silencio
-                    for i in range(end - 5000, search_start, -1000):
-                        if audio[i:i+1000].dBFS < silence_thresh:
-                            end = i
-                            break
+                # Reequilibrar: repartir lo que queda entre los chunks restantes
+                remaining = max(plan["num_chunks"] - chunk_num + 1,
+                                math.ceil((duration_ms - start) / max_chunk_ms))
                 
-                chunk = audio[start:end]
-                chunk_duration_min = (end-start) / 60000
+                if remaining <= 1:
+                    end = duration_ms
+                else:
+                    target = start + (duration_ms - start) // remaining
+                    end = target
                 
-                # Usar formato que OpenAI soporta bien
-                chunk_path = f"{temp_dir}/chunk_{chunk_num:03d}.mp3"
-                chunk.export(chunk_path, format="mp3", bitrate="128k")
-                chunk_paths.append(chunk_path)
+                if end < duration_ms and not overlap_ms:
+                    # Evitar cortar a mitad de oración - cortar en el punto más silencioso cerca del objetivo
+                    search_start = max(target - search_half_ms, start + 10000)
+                    search_end = min(target + search_half_ms, start + max_chunk_ms, duration_ms)
+                    if search_end > search_start:
+                        with timed(self.timings, "decode"):
+                            region = self.decode_window(
+                                file_path, search_start, search_end, frame_rate=ANALYSIS_SAMPLE_RATE, channels=1
+                            )
+                        
+                        # Envolvente de energía calculada una sola vez sobre la región de búsqueda
+                        with timed(self.timings, "silence"):
+                            envelope = energy_envelope(region, frame_ms=SILENCE_FRAME_MS)
+                            quietest = find_quietest_point(envelope, SILENCE_FRAME_MS, 0, len(region))
+                        if quietest is not None:
+                            end = search_start + quietest
+                        del region
                 
-                print(f"      • Chunk {chunk_num}: {chunk_duration_min:.1f} min")
+                # Con solapamiento, cada chunk repite el final del anterior (se deduplica al unir)
+                window_start = max(0, start - overlap_ms)
+                if chunk_num not in skip_indices:
+                    chunks.append(self._export_chunk(file_path, probe, chunk_num, window_start, end))
+                else:
+                    chunks.append(self._skipped_chunk(chunk_num, window_start, end))
                 
                 start = end
                 chunk_num += 1
             
-            return chunk_paths
+            return chunks
             
         except Exception as e:
             raise Exception(f"Error dividiendo audio: {str(e)}")
     
-    def cleanup_temp_files(self, file_paths):
-        """Limpia archivos temporales"""
-        for file_path in file_paths:
-            try:
-                if "/tmp" in file_path or "temp" in file_path:
-                    os.remove(file_path)
-            except:
-                pass
+    def _export_windows(self, file_path, windows, skip_indices, probe=None):
+        """Exporta chunks según un plan ya calculado, omitiendo los indicados"""
+        if len(windows) == 1:
+            start_ms, end_ms = windows[0]
+            if 1 in skip_indices:
+                return [self._skipped_chunk(1, start_ms, end_ms)]
+            return [self._whole_file_chunk(file_path, end_ms)]
+        
+        probe = probe or self.probe_audio(file_path)
+        self.buffered_bytes = 0
+        chunks = []
+        for chunk_num, (start_ms, end_ms) in enumerate(windows, 1):
+            if chunk_num in skip_indices:
+                chunks.append(self._skipped_chunk(chunk_num, start_ms, end_ms))
+                continue
+            chunks.append(self._export_chunk(file_path, probe, chunk_num, start_ms, end_ms))
+        return chunks
+    
+    def _export_chunk(self, file_path, probe, chunk_num, start_ms, end_ms):
+        """
+        Exporta [start_ms, end_ms) como chunk.
+        Si la API acepta el códec de origen se copia el stream (sin recodificar);
+        si no, se recodifica a un formato compacto para voz (mono, 16 kHz).
+        ffmpeg escribe en un pipe y el chunk queda en memoria; superado CHUNK_MEMORY_BUDGET_MB,
+        o si el muxer necesita seek (ver STREAMABLE_MUXERS), se escribe en el directorio de trabajo.
+        """
+        passthrough = PASSTHROUGH_CODECS.get(probe["codec"])
+        if passthrough:
+            codec_args, muxer, extension = passthrough
+            mode = "copia" if codec_args is STREAM_COPY else "sin pérdida"
+        else:
+            codec_args, muxer, extension = SPEECH_EXPORT_FORMATS[Config.CHUNK_EXPORT_FORMAT]
+            codec_args = codec_args + [
+                "-ac", str(Config.CHUNK_EXPORT_CHANNELS),
+                "-ar", str(Config.CHUNK_EXPORT_SAMPLE_RATE),
+                "-b:a", Config.CHUNK_EXPORT_BITRATE,
+            ]
+            mode = "recodificado"
+        
+        chunk_name = f"chunk_{chunk_num:03d}.{extension}"
+        input_args = self._seek_args(start_ms, end_ms) + ["-i", str(file_path), "-vn", "-map_metadata", "-1"]
+        output_args = codec_args + ["-f", muxer] + MUXER_ARGS.get(muxer, [])
+        streamable = muxer in STREAMABLE_MUXERS or muxer in PIPE_MUXER_ARGS
+        with timed(self.timings, "export"):
+            if streamable and self.buffered_bytes < Config.CHUNK_MEMORY_BUDGET_MB * 1024 * 1024:
+                data = self._run_ffmpeg(input_args + output_args + PIPE_MUXER_ARGS.get(muxer, []) + ["pipe:1"])
+                self.buffered_bytes += len(data)
+                audio = AudioBuffer(chunk_name, data=data)
+            else:
+                chunk_path = f"{self._work_dir()}/{chunk_name}"
+                self._run_ffmpeg(input_args + output_args + [chunk_path])
+                audio = AudioBuffer(chunk_name, path=chunk_path)
+                mode += ", en disco"
+        print(f"      • Chunk {chunk_num}: {(end_ms - start_ms) / 60000:.1f} min ({mode})")
+        return {"index": chunk_num, "audio": audio, "start_ms": start_ms, "end_ms": end_ms}
+    
+    def _skipped_chunk(self, chunk_num, start_ms, end_ms):
+        """Chunk del plan que no se exporta (ya transcrito)"""
+        return {"index": chunk_num, "audio": None, "start_ms": start_ms, "end_ms": end_ms}
+    
+    def _whole_file_chunk(self, file_path, duration_ms):
+        """El archivo completo como único chunk (se sube desde disco, sin copiarlo)"""
+        return {"index": 1, "audio": AudioBuffer.from_file(file_path), "start_ms": 0, "end_ms": duration_ms}
+    
+    def _work_dir(self):
+        """Directorio de temporales de este procesador (se crea la primera vez)"""
+        if self.work_dir is None:
+            self.work_dir = ScratchSpace().make_dir()
+        return self.work_dir
+    
+    def cleanup_work_dir(self):
+        """Borra el directorio de temporales (AAC reempaquetado, audio recortado, chunks en disco)"""
+        remove_dir(self.work_dir)
+        self.work_dir = None
     
     def get_output_path(self, input_file_path, extension="txt"):
         """Genera la ruta de salida para la transcripción"""
         self.output_dir.mkdir(exist_ok=True)
         stem = Path(input_file_path).stem
-        return self.output_dir / f"{stem}.{extension}"
\ No newline at end of file
+        return self.output_dir / f"{stem}.{extension}"
+    
+    def get_transcription_output_path(self, input_file_path, model):
+        """Genera la ruta de salida de la transcripción con el sufijo del modelo"""
+        if "mini" in model:
+            model_suffix = "_mini"
+        elif "diarize" in model:
+            model_suffix = "_diarization"
+        else:
+            model_suffix = "_standard"
+        output_path = self.get_output_path(input_file_path)
+        return output_path.with_name(output_path.stem + model_suffix + ".txt")
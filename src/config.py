@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +8,13 @@ class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
     
+    # Backend de la API: URL base (servidor compatible o mock local), timeouts y pool de conexiones
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+    API_TIMEOUT_SEC = float(os.getenv('API_TIMEOUT_SEC', '600'))
+    API_CONNECT_TIMEOUT_SEC = float(os.getenv('API_CONNECT_TIMEOUT_SEC', '10'))
+    API_MAX_CONNECTIONS = int(os.getenv('API_MAX_CONNECTIONS', '20'))
+    API_KEEPALIVE_SEC = float(os.getenv('API_KEEPALIVE_SEC', '60'))
+    
     # Directorio base del proyecto
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
@@ -18,15 +26,18 @@ class Config:
     AVAILABLE_MODELS = {
         "1": {
             "name": "gpt-4o-transcribe",
-            "display_name": "GPT-4O Transcribe (Modelo principal)"
+            "display_name": "GPT-4O Transcribe (Modelo principal)",
+            "cost_per_minute": 0.006
         },
         "2": {
             "name": "gpt-4o-mini-transcribe", 
-            "display_name": "GPT-4O Mini Transcribe (Modelo económico)"
+            "display_name": "GPT-4O Mini Transcribe (Modelo económico)",
+            "cost_per_minute": 0.003
         },
         "3": {
             "name": "gpt-4o-transcribe-diarize",
-            "display_name": "GPT-4O Transcribe Diarization (Separación de hablantes)"
+            "display_name": "GPT-4O Transcribe Diarization (Separación de hablantes)",
+            "cost_per_minute": 0.006
         }
     }
     
@@ -35,4 +46,103 @@ class Config:
     WHISPER_RESPONSE_FORMAT = "text"
     
     # Tamaño máximo de archivo para Whisper (25MB)
-    MAX_FILE_SIZE_MB = 25
\ No newline at end of file
+    MAX_FILE_SIZE_MB = 25
+    
+    # Planificación de chunks
+    MAX_CHUNK_DURATION_SEC = 1300  # Límite de duración por petición
+    CHUNK_SIZE_SAFETY = 0.92       # Margen para cabeceras del contenedor y bitrate variable
+    SILENCE_SEARCH_SEC = 30        # Ventana alrededor de cada corte donde se busca silencio
+    # Solapamiento entre chunks (s). Si es > 0 no se busca silencio: las palabras
+    # repetidas en cada costura se eliminan alineando el texto al unir
+    CHUNK_OVERLAP_SEC = float(os.getenv('CHUNK_OVERLAP_SEC', '0'))
+    
+    # Recorte de pausas largas antes de subir (VAD por energía, sin API); desactivado por defecto
+    VAD_ENABLED = os.getenv('VAD_TRIM', '0') == '1'
+    VAD_MIN_SILENCE_SEC = float(os.getenv('VAD_MIN_SILENCE_SEC', '3'))  # Pausas más cortas se conservan
+    VAD_KEEP_SILENCE_SEC = float(os.getenv('VAD_KEEP_SILENCE_SEC', '1'))  # Pausa que queda en lugar de la eliminada
+    VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', '10'))  # Voz = suelo de ruido + este margen
+    VAD_MIN_SAVING_SEC = 30  # Si se ahorra menos, no compensa recodificar
+    
+    # Concurrencia de transcripción por chunks
+    MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '4'))
+    
+    # Reintentos ante límites de tasa (429) y errores transitorios
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '6'))
+    RATE_LIMIT_BASE_DELAY_SEC = 2.0
+    RATE_LIMIT_MAX_DELAY_SEC = 60.0
+    
+    # Pipeline por etapas (decodificación en procesos, subida en hilos)
+    PIPELINE_DECODE_WORKERS = int(os.getenv('PIPELINE_DECODE_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+    PIPELINE_UPLOAD_WORKERS = int(os.getenv('PIPELINE_UPLOAD_WORKERS', '2'))
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+    
+    # Chunks en memoria (mp3, m4a, ogg/opus): ffmpeg codifica a un buffer y se sube sin pasar por disco;
+    # los flac siempre van al área de trabajo (su cabecera necesita seek).
+    # Cada archivo en curso guarda en RAM hasta este volumen; el resto se vuelca al área de trabajo
+    CHUNK_MEMORY_BUDGET_MB = float(os.getenv('CHUNK_MEMORY_BUDGET_MB', '100'))
+    # Área de trabajo temporal (un directorio por ejecución, se limpia sola)
+    SCRATCH_DIR = os.getenv('SCRATCH_DIR', os.path.join(tempfile.gettempdir(), 'transcriptor'))
+    
+    # Caché de transcripciones por contenido (hash del chunk + modelo + formato)
+    CACHE_ENABLED = os.getenv('TRANSCRIPTION_CACHE', '1') != '0'
+    CACHE_DIR = os.path.join(OUTPUT_DIR, '.cache')
+    CACHE_MAX_SIZE_MB = float(os.getenv('CACHE_MAX_SIZE_MB', '200'))
+    
+    # Índice de los audios de entrada (probe, plan de división y envolvente del VAD) en CACHE_DIR
+    MEDIA_INDEX_ENABLED = os.getenv('MEDIA_INDEX', '1') != '0'
+    
+    # Índice de búsqueda de las transcripciones (SQLite FTS5 en CACHE_DIR, se actualiza al guardar)
+    TRANSCRIPT_INDEX_ENABLED = os.getenv('TRANSCRIPT_INDEX', '1') != '0'
+    
+    # Diarios de trabajos reanudables (plan de división + estado por chunk)
+    JOBS_DIR = os.path.join(OUTPUT_DIR, '.jobs')
+    
+    # Recodificación de chunks cuando el códec de origen no admite copia de stream
+    # Formato compacto para voz: mono, 16 kHz (mp3 u opus)
+    CHUNK_EXPORT_FORMAT = os.getenv('CHUNK_EXPORT_FORMAT', 'mp3')
+    CHUNK_EXPORT_BITRATE = os.getenv('CHUNK_EXPORT_BITRATE', '48k')
+    CHUNK_EXPORT_SAMPLE_RATE = 16000
+    CHUNK_EXPORT_CHANNELS = 1
+    
+    # Mejora de diarización por ventanas (map-reduce) para entrevistas largas
+    IMPROVE_WINDOW_SEC = float(os.getenv('IMPROVE_WINDOW_SEC', '600'))
+    IMPROVE_WINDOW_MAX_TOKENS = 4000
+    IMPROVE_CONCURRENCY = int(os.getenv('IMPROVE_CONCURRENCY', '4'))
+    IMPROVE_FILE_CONCURRENCY = int(os.getenv('IMPROVE_FILE_CONCURRENCY', '4'))
+    
+    # Modo servicio (--watch): sondeo del directorio de entrada y cola persistente
+    WATCH_POLL_SEC = float(os.getenv('WATCH_POLL_SEC', '5'))
+    WATCH_SETTLE_SEC = float(os.getenv('WATCH_SETTLE_SEC', '10'))  # Sin cambios durante este tiempo
+    WATCH_STABLE_CHECKS = int(os.getenv('WATCH_STABLE_CHECKS', '2'))  # Sondeos seguidos con mismo tamaño/mtime
+    WATCH_MAX_ATTEMPTS = int(os.getenv('WATCH_MAX_ATTEMPTS', '3'))  # Intentos por archivo antes de abandonarlo
+    WATCH_RETRY_DELAY_SEC = float(os.getenv('WATCH_RETRY_DELAY_SEC', '300'))  # Espera antes de reintentar un fallo
+    WATCH_DIR = os.path.join(OUTPUT_DIR, '.watch')
+    
+    # Workers: cola compartida (SQLite; en un volumen compartido para repartir entre hosts)
+    WORK_QUEUE_DB = os.getenv('WORK_QUEUE_DB', '')  # Vacío = WATCH_DIR/queue.db
+    WORKER_LEASE_SEC = float(os.getenv('WORKER_LEASE_SEC', '120'))  # Sin renovar, el archivo pasa a otro worker
+    
+    # Informes de ejecución (tiempos por etapa, latencia de la API, coste estimado)
+    REPORTS_DIR = os.path.join(OUTPUT_DIR, '.reports')
+    # Archivo de métricas Prometheus (textfile collector de node_exporter); vacío = desactivado
+    METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE', '')
+    
+    # Segmentos estructurados (JSONL: speaker, start, end, text) junto a cada transcripción diarizada
+    SEGMENTS_SUFFIX = ".segments.jsonl"
+    
+    @classmethod
+    def set_output_dir(cls, output_dir):
+        """Cambia el directorio de salida y los directorios de trabajo que dependen de él"""
+        cls.OUTPUT_DIR = os.path.abspath(output_dir)
+        cls.CACHE_DIR = os.path.join(cls.OUTPUT_DIR, '.cache')
+        cls.JOBS_DIR = os.path.join(cls.OUTPUT_DIR, '.jobs')
+        cls.REPORTS_DIR = os.path.join(cls.OUTPUT_DIR, '.reports')
+        cls.WATCH_DIR = os.path.join(cls.OUTPUT_DIR, '.watch')
+    
+    @classmethod
+    def model_cost_per_minute(cls, model):
+        """Precio por minuto de audio (USD) del modelo, o 0 si no está en AVAILABLE_MODELS"""
+        for model_info in cls.AVAILABLE_MODELS.values():
+            if model_info["name"] == model:
+                return model_info.get("cost_per_minute", 0.0)
+        return 0.0
@@ -0,0 +1,113 @@
+"""
+Diario de trabajos reanudables
+Guarda el plan de división y el estado/resultado de cada chunk junto a outputs/
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from config import Config
+
+
+class JobJournal:
+    STATUS_PENDING = "pending"
+    STATUS_DONE = "done"
+
+    def __init__(self, output_path):
+        """
+        Args:
+            output_path: Ruta final de la transcripción (define el nombre del diario)
+        """
+        self.output_path = Path(output_path)
+        self.path = Path(Config.JOBS_DIR) / f"{self.output_path.stem}.json"
+        self.data = None
+        self._lock = threading.Lock()
+
+    def load(self, source_file, model):
+        """
+        Carga el diario existente si corresponde al mismo archivo y modelo.
+
+        Returns:
+            True si hay un plan previo reutilizable
+        """
+        if not self.path.exists():
+            return False
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+
+        source_stat = Path(source_file).stat()
+        if (data.get("model") != model
+                or data.get("source_size") != source_stat.st_size
+                or data.get("source_mtime") != source_stat.st_mtime
+                or data.get("vad", False) != Config.VAD_ENABLED):
+            # El audio, el modelo o el recorte de pausas cambiaron: el plan guardado ya no es válido
+            return False
+
+        self.data = data
+        return True
+
+    def start(self, source_file, model, chunks):
+        """Crea un diario nuevo con el plan de división"""
+        source_stat = Path(source_file).stat()
+        self.data = {
+            "source": str(source_file),
+            "source_size": source_stat.st_size,
+            "source_mtime": source_stat.st_mtime,
+            "model": model,
+            # Con VAD las ventanas están en la línea de tiempo del audio recortado
+            "vad": Config.VAD_ENABLED,
+            "output": str(self.output_path),
+            "created_at": time.time(),
+            "chunks": [
+                {
+                    "index": chunk["index"],
+                    "start_ms": chunk["start_ms"],
+                    "end_ms": chunk["end_ms"],
+                    "status": self.STATUS_PENDING,
+                    "result": None,
+                }
+                for chunk in chunks
+            ],
+        }
+        self._write()
+
+    @property
+    def windows(self):
+        """Plan de división [(start_ms, end_ms), ...]"""
+        return [(chunk["start_ms"], chunk["end_ms"]) for chunk in self.data["chunks"]]
+
+    def done_indices(self):
+        """Índices de chunks ya transcritos"""
+        return {chunk["index"] for chunk in self.data["chunks"] if chunk["status"] == self.STATUS_DONE}
+
+    def mark_done(self, index, result):
+        """Registra el resultado normalizado de un chunk (seguro entre hilos)"""
+        with self._lock:
+            for chunk in self.data["chunks"]:
+                if chunk["index"] == index:
+                    chunk["status"] = self.STATUS_DONE
+                    chunk["result"] = result
+                    break
+            self._write()
+
+    def results(self):
+        """Resultados de todos los chunks en orden"""
+        return [chunk["result"] for chunk in sorted(self.data["chunks"], key=lambda c: c["index"])]
+
+    def finish(self):
+        """Elimina el diario cuando la transcripción final ya está guardada"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _write(self):
+        """Escritura atómica: un corte a mitad de escritura no corrompe el diario"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
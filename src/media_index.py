@@ -0,0 +1,155 @@
+"""
+Índice persistente de metadatos de los audios de entrada (SQLite)
+Cada archivo se identifica por ruta + tamaño + mtime; si cambian, el hash del contenido
+permite reaprovechar lo ya calculado (archivo renombrado, copiado o solo tocado).
+Guarda el probe de ffprobe, el plan de división con los cortes ya buscados en silencio
+y la envolvente de energía del VAD: repetir un escaneo o un --dry-run no decodifica nada
+"""
+
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from pathlib import Path
+from config import Config
+from transcription_cache import TranscriptionCache
+
+
+class MediaIndex:
+    def __init__(self, db_path=None):
+        # Sin lock de hilos: el índice se pasa a los procesos de decodificación
+        # y SQLite ya serializa las escrituras entre procesos
+        self.db_path = Path(db_path or Path(Config.CACHE_DIR) / "media.db")
+        # ruta -> (tamaño, mtime, hash) calculados en este proceso
+        self._hashes = {}
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    probe TEXT NOT NULL,
+                    plan TEXT,
+                    envelope BLOB,
+                    envelope_frame_ms INTEGER,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_content_hash ON media(content_hash)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _content_hash(self, path, size, mtime):
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (size, mtime):
+            return cached[2]
+        content_hash = TranscriptionCache.hash_file(path)
+        self._hashes[path] = (size, mtime, content_hash)
+        return content_hash
+
+    def _current_row(self, conn, file_path, by_content=True):
+        """
+        Fila vigente del archivo (reasignada desde otra ruta con el mismo contenido si hace falta).
+        Con by_content=False solo se busca por ruta + tamaño + mtime, sin leer el archivo entero.
+
+        Returns:
+            (ruta, fila) o (ruta, None) si no está indexado
+        """
+        path = str(Path(file_path).absolute())
+        stat = os.stat(path)
+        row = conn.execute(
+            "SELECT probe, plan, envelope, envelope_frame_ms FROM media WHERE path = ? AND size = ? AND mtime = ?",
+            (path, stat.st_size, stat.st_mtime)
+        ).fetchone()
+        if row is not None or not by_content:
+            return path, row
+
+        # Ruta nueva o firma distinta: mismo contenido que otra entrada -> se reaprovecha
+        content_hash = self._content_hash(path, stat.st_size, stat.st_mtime)
+        row = conn.execute(
+            "SELECT probe, plan, envelope, envelope_frame_ms FROM media WHERE content_hash = ? LIMIT 1",
+            (content_hash,)
+        ).fetchone()
+        if row is None:
+            return path, None
+        conn.execute(
+            "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, content_hash, *row, time.time())
+        )
+        return path, row
+
+    def get_probe(self, file_path, by_content=True):
+        """
+        Probe guardado (dict de AudioProcessor.probe_audio) o None.
+        by_content=False omite la búsqueda por hash (no lee el archivo entero)
+        """
+        with self._connect() as conn:
+            _, row = self._current_row(conn, file_path, by_content)
+        return json.loads(row[0]) if row else None
+
+    def put_probe(self, file_path, probe):
+        """Indexa el archivo; el plan y la envolvente anteriores se descartan"""
+        path = str(Path(file_path).absolute())
+        stat = os.stat(path)
+        content_hash = self._content_hash(path, stat.st_size, stat.st_mtime)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (path, size, mtime, content_hash, probe, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime, content_hash, json.dumps(probe), time.time())
+            )
+
+    def get_plan(self, file_path, signature):
+        """Cortes [(start_ms, end_ms), ...] calculados con la misma configuración, o None"""
+        with self._connect() as conn:
+            _, row = self._current_row(conn, file_path)
+        if not row or not row[1]:
+            return None
+        plan = json.loads(row[1])
+        if plan["signature"] != signature:
+            return None
+        return [tuple(window) for window in plan["windows"]]
+
+    def put_plan(self, file_path, signature, windows):
+        """Guarda los cortes definitivos (solo si el archivo ya está indexado)"""
+        plan = json.dumps({"signature": signature, "windows": [list(window) for window in windows]})
+        with self._connect() as conn:
+            path, row = self._current_row(conn, file_path)
+            if row is not None:
+                conn.execute("UPDATE media SET plan = ?, updated_at = ? WHERE path = ?", (plan, time.time(), path))
+
+    def get_envelope(self, file_path, frame_ms):
+        """Envolvente de energía (dBFS por frame) de todo el archivo, o None"""
+        with self._connect() as conn:
+            _, row = self._current_row(conn, file_path)
+        if not row or row[2] is None or row[3] != frame_ms:
+            return None
+        return np.frombuffer(row[2], dtype=np.float16).astype(np.float32)
+
+    def put_envelope(self, file_path, frame_ms, envelope):
+        """Guarda la envolvente en float16 (2 bytes por frame: ~700 KB por hora a 10 ms)"""
+        blob = np.asarray(envelope, dtype=np.float16).tobytes()
+        with self._connect() as conn:
+            path, row = self._current_row(conn, file_path)
+            if row is not None:
+                conn.execute(
+                    "UPDATE media SET envelope = ?, envelope_frame_ms = ?, updated_at = ? WHERE path = ?",
+                    (blob, frame_ms, time.time(), path)
+                )
+
+    def prune(self):
+        """
+        Olvida los archivos que ya no existen.
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        with self._connect() as conn:
+            missing = [(path,) for (path,) in conn.execute("SELECT path FROM media") if not os.path.exists(path)]
+            conn.executemany("DELETE FROM media WHERE path = ?", missing)
+        return len(missing)
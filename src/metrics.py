@@ -0,0 +1,295 @@
+"""
+Métricas de ejecución
+Tiempos por etapa, volumen subido, latencia de la API, reintentos y coste estimado por modelo.
+Al terminar se escribe un informe JSON/CSV y, opcionalmente, un archivo de métricas Prometheus
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from config import Config
+
+# Etapas de la decodificación/división (medidas en el proceso hijo)
+SPLIT_STAGES = ("prepare", "vad", "probe", "decode", "silence", "export")
+# Etapas por modelo (medidas en los hilos de subida)
+MODEL_STAGES = ("upload", "postprocess")
+
+
+@contextmanager
+def timed(timings, stage):
+    """Acumula en timings[stage] los segundos que tarda el bloque"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def _percentile(values, fraction):
+    """Percentil por el método del rango más cercano (sin dependencias)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class ModelMetrics:
+    """Métricas de un archivo transcrito con un modelo (se actualiza desde varios hilos)"""
+
+    def __init__(self, model):
+        self.model = model
+        self.status = "pending"
+        self.error = None
+        self.timings = {}
+        self.requests = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.resumed_chunks = 0
+        self.bytes_uploaded = 0
+        self.audio_sec = 0.0
+        self.throttle_sec = 0.0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record_request(self, bytes_sent, audio_sec, latency_sec, retries=0, throttle_sec=0.0):
+        """Registra una petición a la API (latencia del intento que tuvo éxito)"""
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.bytes_uploaded += bytes_sent
+            self.audio_sec += audio_sec
+            self.throttle_sec += throttle_sec
+            self.latencies.append(latency_sec)
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    @property
+    def estimated_cost(self):
+        """Coste estimado (USD) del audio enviado a la API; la caché no cuenta"""
+        return self.audio_sec / 60 * Config.model_cost_per_minute(self.model)
+
+    def as_dict(self):
+        with self._lock:
+            latencies = list(self.latencies)
+        return {
+            "model": self.model,
+            "status": self.status,
+            "error": self.error,
+            "timings": {stage: round(self.timings.get(stage, 0.0), 3) for stage in MODEL_STAGES},
+            "requests": self.requests,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "resumed_chunks": self.resumed_chunks,
+            "bytes_uploaded": self.bytes_uploaded,
+            "audio_sec": round(self.audio_sec, 3),
+            "throttle_sec": round(self.throttle_sec, 3),
+            "latency_sec": {
+                "sum": round(sum(latencies), 3),
+                "p50": round(_percentile(latencies, 0.5), 3),
+                "p95": round(_percentile(latencies, 0.95), 3),
+                "max": round(max(latencies, default=0.0), 3),
+            },
+            "estimated_cost_usd": round(self.estimated_cost, 4),
+        }
+
+
+class FileMetrics:
+    """Métricas de un archivo de audio: etapas de división y un ModelMetrics por modelo"""
+
+    def __init__(self, audio_file, models):
+        self.name = Path(audio_file).name
+        self.size_bytes = Path(audio_file).stat().st_size
+        self.duration_sec = 0.0
+        self.silence_removed_sec = 0.0
+        self.num_chunks = 0
+        self.timings = {}
+        self.models = {model: ModelMetrics(model) for model in models}
+
+    def as_dict(self):
+        return {
+            "file": self.name,
+            "size_bytes": self.size_bytes,
+            "duration_sec": round(self.duration_sec, 3),
+            "silence_removed_sec": round(self.silence_removed_sec, 3),
+            "num_chunks": self.num_chunks,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+            "models": [model.as_dict() for model in self.models.values()],
+        }
+
+
+class RunMetrics:
+    """Métricas de una ejecución completa del pipeline"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.files = []
+        self._lock = threading.Lock()
+
+    def add_file(self, audio_file, models):
+        file_metrics = FileMetrics(audio_file, models)
+        with self._lock:
+            self.files.append(file_metrics)
+        return file_metrics
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def _model_metrics(self):
+        return [model for file_metrics in self.files for model in file_metrics.models.values()]
+
+    def totals(self):
+        """Totales de la ejecución: tiempo por etapa, volumen, reintentos y coste"""
+        wall_sec = (self.finished_at or time.time()) - self.started_at
+        stage_sec = {}
+        for file_metrics in self.files:
+            for stage, seconds in file_metrics.timings.items():
+                stage_sec[stage] = stage_sec.get(stage, 0.0) + seconds
+        models = self._model_metrics()
+        for model in models:
+            for stage, seconds in model.timings.items():
+                stage_sec[stage] = stage_sec.get(stage, 0.0) + seconds
+
+        audio_sec = sum(file_metrics.duration_sec for file_metrics in self.files)
+        return {
+            "wall_sec": round(wall_sec, 3),
+            "files": len(self.files),
+            "audio_sec": round(audio_sec, 3),
+            "silence_removed_sec": round(sum(file_metrics.silence_removed_sec for file_metrics in self.files), 3),
+            # Segundos de audio procesados por segundo de reloj
+            "realtime_factor": round(audio_sec / wall_sec, 2) if wall_sec else 0.0,
+            "stage_sec": {stage: round(seconds, 3) for stage, seconds in stage_sec.items()},
+            "requests": sum(model.requests for model in models),
+            "retries": sum(model.retries for model in models),
+            "cache_hits": sum(model.cache_hits for model in models),
+            "bytes_uploaded": sum(model.bytes_uploaded for model in models),
+            "estimated_cost_usd": round(sum(model.estimated_cost for model in models), 4),
+        }
+
+    def as_dict(self):
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "finished_at": (datetime.fromtimestamp(self.finished_at).isoformat(timespec="seconds")
+                            if self.finished_at else None),
+            "totals": self.totals(),
+            "files": [file_metrics.as_dict() for file_metrics in self.files],
+        }
+
+    def write_report(self, reports_dir=None):
+        """
+        Escribe el informe de la ejecución en JSON (completo) y CSV (una fila por archivo y modelo).
+
+        Returns:
+            Ruta del informe JSON
+        """
+        reports_dir = Path(reports_dir or Config.REPORTS_DIR)
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"run_{datetime.fromtimestamp(self.started_at):%Y%m%d_%H%M%S}"
+
+        json_path = reports_dir / f"{stem}.json"
+        json_path.write_text(json.dumps(self.as_dict(), ensure_ascii=False, indent=2), encoding='utf-8')
+
+        columns = (["file", "model", "status", "size_bytes", "duration_sec", "silence_removed_sec", "num_chunks"]
+                   + [f"{stage}_sec" for stage in SPLIT_STAGES + ("decode_wait",) + MODEL_STAGES]
+                   + ["requests", "retries", "cache_hits", "bytes_uploaded", "audio_sec", "throttle_sec",
+                      "latency_p50_sec", "latency_p95_sec", "latency_max_sec", "estimated_cost_usd"])
+        with open(reports_dir / f"{stem}.csv", 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for file_metrics in self.files:
+                file_row = file_metrics.as_dict()
+                for model in file_row["models"]:
+                    row = {key: file_row[key] for key in ("file", "size_bytes", "duration_sec", "silence_removed_sec",
+                                                          "num_chunks")}
+                    row.update({f"{stage}_sec": seconds for stage, seconds in file_row["timings"].items()})
+                    row.update({f"{stage}_sec": seconds for stage, seconds in model["timings"].items()})
+                    row.update({key: model[key] for key in ("model", "status", "requests", "retries", "cache_hits",
+                                                            "bytes_uploaded", "audio_sec", "throttle_sec",
+                                                            "estimated_cost_usd")})
+                    row.update({f"latency_{key}_sec": model["latency_sec"][key] for key in ("p50", "p95", "max")})
+                    writer.writerow(row)
+
+        return json_path
+
+    def prometheus_text(self):
+        """Métricas en formato de exposición de Prometheus"""
+        totals = self.totals()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        per_model = {}
+        for model in self._model_metrics():
+            entry = per_model.setdefault(model.model, {
+                "requests": 0, "retries": 0, "cache_hits": 0, "bytes": 0, "audio_sec": 0.0,
+                "throttle_sec": 0.0, "latency_sum": 0.0, "latency_count": 0, "cost": 0.0,
+                "completed": 0, "failed": 0,
+            })
+            entry["requests"] += model.requests
+            entry["retries"] += model.retries
+            entry["cache_hits"] += model.cache_hits
+            entry["bytes"] += model.bytes_uploaded
+            entry["audio_sec"] += model.audio_sec
+            entry["throttle_sec"] += model.throttle_sec
+            entry["latency_sum"] += sum(model.latencies)
+            entry["latency_count"] += len(model.latencies)
+            entry["cost"] += model.estimated_cost
+            if model.status in ("completed", "failed"):
+                entry[model.status] += 1
+
+        def by_model(key):
+            return [({"model": model}, round(entry[key], 4)) for model, entry in per_model.items()]
+
+        metric("transcriptor_run_wall_seconds", "gauge", "Duración de la última ejecución",
+               [({}, totals["wall_sec"])])
+        metric("transcriptor_run_finished_timestamp_seconds", "gauge", "Fin de la última ejecución (epoch)",
+               [({}, round(self.finished_at or time.time(), 3))])
+        metric("transcriptor_audio_seconds", "gauge", "Segundos de audio procesados en la última ejecución",
+               [({}, totals["audio_sec"])])
+        metric("transcriptor_stage_seconds", "gauge", "Tiempo acumulado por etapa en la última ejecución",
+               [({"stage": stage}, seconds) for stage, seconds in totals["stage_sec"].items()])
+        metric("transcriptor_transcriptions", "gauge", "Transcripciones por modelo y estado",
+               [({"model": model, "status": status}, entry[status])
+                for model, entry in per_model.items() for status in ("completed", "failed")])
+        metric("transcriptor_api_requests", "gauge", "Peticiones a la API", by_model("requests"))
+        metric("transcriptor_api_retries", "gauge", "Reintentos por 429 o errores transitorios", by_model("retries"))
+        metric("transcriptor_api_throttle_seconds", "gauge", "Espera acumulada por backoff", by_model("throttle_sec"))
+        metric("transcriptor_api_latency_seconds_sum", "gauge", "Suma de latencias de la API",
+               by_model("latency_sum"))
+        metric("transcriptor_api_latency_seconds_count", "gauge", "Número de latencias medidas",
+               by_model("latency_count"))
+        metric("transcriptor_cache_hits", "gauge", "Chunks servidos desde la caché", by_model("cache_hits"))
+        metric("transcriptor_uploaded_bytes", "gauge", "Bytes subidos a la API", by_model("bytes"))
+        metric("transcriptor_estimated_cost_usd", "gauge", "Coste estimado en USD", by_model("cost"))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Escritura atómica para el textfile collector de node_exporter"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.prometheus_text(), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Resumen legible de una línea por grupo de etapas"""
+        totals = self.totals()
+        stage_sec = totals["stage_sec"]
+        split_sec = sum(stage_sec.get(stage, 0.0) for stage in SPLIT_STAGES)
+        return (f"⏱️  {totals['wall_sec']:.0f}s en total ({totals['realtime_factor']}x tiempo real) | "
+                f"ffmpeg {split_sec:.0f}s | espera de decodificación {stage_sec.get('decode_wait', 0.0):.0f}s | "
+                f"subida {stage_sec.get('upload', 0.0):.0f}s ({totals['requests']} peticiones, "
+                f"{totals['retries']} reintentos, {totals['bytes_uploaded'] / (1024 * 1024):.1f}MB) | "
+                f"💰 ~${totals['estimated_cost_usd']:.2f}")
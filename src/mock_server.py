@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatible con la API de OpenAI para pruebas sin red
+Reproduce respuestas grabadas (o sintéticas) con latencia, jitter y errores 429 inyectados.
+Con --upstream actúa de proxy hacia la API real y graba sus respuestas para reproducirlas después.
+
+Uso:
+    venv/bin/python src/mock_server.py --port 8765 --latency 1.5 --jitter 0.5 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 venv/bin/python src/transcriptor.py -m 1 3
+    curl http://127.0.0.1:8765/stats
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Bytes por segundo de audio supuestos para dimensionar las respuestas sintéticas (64 kbps)
+_BYTES_PER_AUDIO_SEC = 8000
+_WORDS_PER_SEC = 2.5
+_SEGMENT_SEC = 10
+
+_ENDPOINTS = {
+    "/v1/audio/transcriptions": "transcriptions",
+    "/v1/chat/completions": "chat",
+}
+
+
+def parse_multipart(content_type, body):
+    """Campos de un formulario multipart/form-data: {nombre: bytes}"""
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = part.get_payload(decode=True) or b""
+    return fields
+
+
+def _recording_key(endpoint, fields):
+    """Nombre del archivo de grabación: endpoint/modelo[__formato].json"""
+    model = re.sub(r"[^\w.-]+", "_", fields.get("model", "default"))
+    if endpoint == "transcriptions":
+        model += "__" + re.sub(r"[^\w.-]+", "_", fields.get("response_format", "json"))
+    return Path(endpoint) / f"{model}.json"
+
+
+def synthetic_transcription(model, response_format, audio_bytes):
+    """Respuesta de transcripción con un tamaño proporcional al audio recibido"""
+    audio_sec = audio_bytes / _BYTES_PER_AUDIO_SEC
+    words = ["texto", "simulado", "de", "la", "transcripción"] * max(1, int(audio_sec * _WORDS_PER_SEC / 5))
+    text = " ".join(words)
+    if response_format == "text":
+        return "text/plain; charset=utf-8", text
+    if response_format == "diarized_json" or "diarize" in model:
+        per_segment = int(_SEGMENT_SEC * _WORDS_PER_SEC)
+        segments = [
+            {
+                "type": "transcript.text.segment",
+                "id": f"seg_{i // per_segment}",
+                "speaker": "AB"[(i // per_segment) % 2],
+                "start": i / _WORDS_PER_SEC,
+                "end": min(audio_sec, (i + per_segment) / _WORDS_PER_SEC),
+                "text": " ".join(words[i:i + per_segment]),
+            }
+            for i in range(0, len(words), per_segment)
+        ]
+        body = {"task": "transcribe", "duration": audio_sec, "text": text, "segments": segments}
+        return "application/json", json.dumps(body, ensure_ascii=False)
+    return "application/json", json.dumps({"text": text}, ensure_ascii=False)
+
+
+def synthetic_completion(model):
+    body = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "[A] (0s-0s): Respuesta simulada."},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+    return "application/json", json.dumps(body)
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recordings_dir=None, latency_sec=0.0, jitter_sec=0.0,
+                 error_rate=0.0, retry_after_sec=1.0, upstream=None, seed=None):
+        """
+        Args:
+            recordings_dir: Directorio de respuestas grabadas (se graban aquí con upstream)
+            latency_sec: Latencia fija añadida a cada respuesta
+            jitter_sec: Variación aleatoria (±) de la latencia
+            error_rate: Fracción de peticiones que responden 429 con Retry-After
+            upstream: URL base de la API real (modo proxy con grabación)
+        """
+        super().__init__(address, MockAPIHandler)
+        self.recordings_dir = Path(recordings_dir) if recordings_dir else None
+        self.latency_sec = latency_sec
+        self.jitter_sec = jitter_sec
+        self.error_rate = error_rate
+        self.retry_after_sec = retry_after_sec
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors_injected": 0, "connections": 0,
+                      "in_flight": 0, "max_in_flight": 0, "bytes_received": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def start_in_thread(self):
+        """Arranca el servidor en un hilo (para benchmarks); detener con shutdown()"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def delay(self):
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_sec, self.jitter_sec) if self.jitter_sec else 0.0
+            inject_error = self.random.random() < self.error_rate
+        return max(0.0, self.latency_sec + jitter), inject_error
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que los clientes reutilicen la conexión (keep-alive)
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Un handler por conexión TCP: cuenta cuántas abre el cliente
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, content_type, body, headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send(200, "application/json", json.dumps(self.server.snapshot()))
+        else:
+            self._send(404, "application/json", json.dumps({"error": {"message": "not found"}}))
+
+    def do_POST(self):
+        body = self._read_body()
+        endpoint = _ENDPOINTS.get(self.path.split("?")[0].rstrip("/"))
+        if endpoint is None:
+            self._send(404, "application/json", json.dumps({"error": {"message": f"ruta desconocida: {self.path}"}}))
+            return
+
+        server = self.server
+        server.count("requests")
+        server.count("bytes_received", len(body))
+        server.count("in_flight")
+        try:
+            latency, inject_error = server.delay()
+            if inject_error:
+                server.count("errors_injected")
+                time.sleep(latency / 2)
+                self._send(429, "application/json",
+                           json.dumps({"error": {"message": "Rate limit simulado", "type": "rate_limit_error"}}),
+                           headers={"Retry-After": f"{server.retry_after_sec:g}"})
+                return
+
+            status, content_type, response = self._respond(endpoint, body)
+            time.sleep(latency)
+            self._send(status, content_type, response)
+        finally:
+            server.count("in_flight", -1)
+
+    def _respond(self, endpoint, body):
+        """Respuesta grabada, del upstream (y se graba) o sintética, en ese orden"""
+        if endpoint == "transcriptions":
+            raw_fields = parse_multipart(self.headers.get("Content-Type", ""), body)
+            audio_bytes = len(raw_fields.pop("file", b""))
+            fields = {name: value.decode("utf-8", errors="ignore") for name, value in raw_fields.items()}
+        else:
+            payload = json.loads(body or b"{}")
+            audio_bytes = 0
+            fields = {"model": str(payload.get("model", "default"))}
+
+        server = self.server
+        recording = server.recordings_dir / _recording_key(endpoint, fields) if server.recordings_dir else None
+        if server.upstream:
+            status, content_type, response = self._forward(body)
+            if status == 200 and recording is not None:
+                recording.parent.mkdir(parents=True, exist_ok=True)
+                recording.write_text(json.dumps({"content_type": content_type, "body": response.decode("utf-8")},
+                                                ensure_ascii=False), encoding="utf-8")
+            return status, content_type, response
+
+        if recording is not None and recording.exists():
+            recorded = json.loads(recording.read_text(encoding="utf-8"))
+            return 200, recorded["content_type"], recorded["body"]
+
+        if endpoint == "transcriptions":
+            return (200, *synthetic_transcription(fields.get("model", ""), fields.get("response_format", "json"),
+                                                  audio_bytes))
+        return (200, *synthetic_completion(fields["model"]))
+
+    def _forward(self, body):
+        """Reenvía la petición a la API real"""
+        path = self.path[len("/v1"):] if self.path.startswith("/v1") else self.path
+        headers = {key: self.headers[key] for key in ("Authorization", "Content-Type") if self.headers.get(key)}
+        request = urllib.request.Request(self.server.upstream + path, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return response.status, response.headers.get("Content-Type", "application/json"), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("Content-Type", "application/json"), e.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatible con la API de OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", metavar="DIR", help="Directorio de respuestas grabadas")
+    parser.add_argument("--latency", type=float, default=1.0, help="Latencia por respuesta en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación (±) de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de las respuestas 429")
+    parser.add_argument("--upstream", metavar="URL", help="Proxy hacia la API real grabando en --recordings")
+    parser.add_argument("--seed", type=int, help="Semilla para latencias y errores reproducibles")
+    args = parser.parse_args()
+
+    server = MockAPIServer((args.host, args.port), recordings_dir=args.recordings, latency_sec=args.latency,
+                           jitter_sec=args.jitter, error_rate=args.error_rate, retry_after_sec=args.retry_after,
+                           upstream=args.upstream, seed=args.seed)
+    mode = f"proxy a {server.upstream}" if server.upstream else "simulado"
+    print(f"🧪 API {mode} en {server.base_url} (latencia {args.latency}s ±{args.jitter}s, "
+          f"429 {args.error_rate:.0%})")
+    print(f"   OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\n📊 {json.dumps(server.snapshot())}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,221 @@
-from openai import OpenAI
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from pathlib import Path
 from config import Config
+from api_client import OpenAIBackend
+from scratch import as_audio_buffer
+from transcription_cache import TranscriptionCache
+from stitcher import rebase_result
+
+# Errores transitorios que vale la pena reintentar con backoff
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
 
 class OpenAITranscriptionService:
-    def __init__(self):
-        if not Config.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY no encontrada en las variables de entorno")
+    def __init__(self, cache=None, backend=None):
+        """
+        Args:
+            backend: TranscriptionBackend a usar (por defecto la API de OpenAI con el cliente compartido)
+        """
+        # Los reintentos los gestiona _create_with_backoff (respeta Retry-After)
+        self.backend = backend or OpenAIBackend()
+        # Límite global de peticiones simultáneas, compartido entre archivos
+        self._request_slots = threading.BoundedSemaphore(Config.MAX_CONCURRENT_REQUESTS)
+        # Caché por contenido: evita pagar de nuevo por audio ya transcrito
+        if cache is None and Config.CACHE_ENABLED:
+            cache = TranscriptionCache()
+        self.cache = cache
+        
+    def _retry_delay(self, error, attempt):
+        """Calcula la espera antes del siguiente intento (Retry-After o backoff exponencial con jitter)"""
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            try:
+                if retry_after:
+                    return min(float(retry_after), Config.RATE_LIMIT_MAX_DELAY_SEC)
+            except ValueError:
+                pass
+        
+        delay = Config.RATE_LIMIT_BASE_DELAY_SEC * (2 ** attempt)
+        return min(delay, Config.RATE_LIMIT_MAX_DELAY_SEC) * random.uniform(0.5, 1.0)
+    
+    def _create_with_backoff(self, params, request_stats=None):
+        """
+        Llama a la API de transcripción reintentando ante 429 y errores transitorios.
         
-        self.client = OpenAI()
+        Args:
+            request_stats: Diccionario opcional donde se anotan retries, throttle_sec y latency_sec
+        """
+        request_stats = request_stats if request_stats is not None else {}
+        request_stats.update(retries=0, throttle_sec=0.0, latency_sec=0.0)
+        attempt = 0
+        while True:
+            try:
+                with self._request_slots:
+                    # Latencia de la API sin contar la espera por un hueco de concurrencia
+                    started = time.perf_counter()
+                    transcript = self.backend.transcribe(**params)
+                    request_stats["latency_sec"] = time.perf_counter() - started
+                    return transcript
+            except RETRYABLE_ERRORS as e:
+                if attempt >= Config.RATE_LIMIT_MAX_RETRIES:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                print(f"      ⏳ {type(e).__name__}, reintentando en {delay:.1f}s ({attempt + 1}/{Config.RATE_LIMIT_MAX_RETRIES})")
+                time.sleep(delay)
+                attempt += 1
+                request_stats["retries"] = attempt
+                request_stats["throttle_sec"] += delay
+                # Rebobinar el archivo (o buffer) para reenviarlo completo
+                params["file"].seek(0)
         
     def transcribe_audio(self, audio_file_path, model=None):
         """Transcribe un archivo de audio usando OpenAI"""
+        return self.format_result(self.transcribe_segments(audio_file_path, model=model))
+    
+    def transcribe_segments(self, audio_file_path, model=None, offset_sec=0.0, duration_sec=0.0, metrics=None):
+        """
+        Transcribe un archivo de audio y devuelve el resultado normalizado.
+        
+        Args:
+            audio_file_path: Ruta del audio o AudioBuffer (chunk en memoria)
+            offset_sec: Inicio del chunk en la grabación original; los timestamps se desplazan
+            duration_sec: Duración del audio enviado (para estimar el coste)
+            metrics: ModelMetrics opcional donde se registran la petición o el acierto de caché
+        
+        Returns:
+            Diccionario {"text": ...} o {"segments": [...]} con tiempos globales
+        """
         try:
             # Usar modelo específico o el por defecto
             selected_model = model if model else Config.WHISPER_MODEL
+            audio = as_audio_buffer(audio_file_path)
             
             # Verificar tamaño del archivo
-            file_size_mb = Path(audio_file_path).stat().st_size / (1024 * 1024)
+            file_size_mb = audio.size / (1024 * 1024)
             if file_size_mb > Config.MAX_FILE_SIZE_MB:
                 raise Exception(f"Archivo muy grande ({file_size_mb:.1f}MB). Máximo permitido: {Config.MAX_FILE_SIZE_MB}MB")
             
-            with open(audio_file_path, "rb") as audio_file:
-                # Configurar parámetros según el modelo
-                params = {
-                    "model": selected_model,
-                    "file": audio_file,
-                    "response_format": Config.WHISPER_RESPONSE_FORMAT
-                }
-                
-                # Para modelos de diarización, añadir chunking_strategy y response_format
-                if "diarize" in selected_model:
-                    params["chunking_strategy"] = "auto"
-                    params["response_format"] = "diarized_json"
-                
-                transcript = self.client.audio.transcriptions.create(**params)
+            # Para modelos de diarización se pide JSON con segmentos
+            response_format = "diarized_json" if "diarize" in selected_model else Config.WHISPER_RESPONSE_FORMAT
             
-            # Manejar diferentes formatos de respuesta
-            if "diarize" in selected_model:
-                # Para diarización, formatear los segmentos
-                if hasattr(transcript, 'segments'):
-                    formatted_text = []
-                    for segment in transcript.segments:
-                        speaker = getattr(segment, 'speaker', 'Unknown')
-                        text = getattr(segment, 'text', '')
-                        start = getattr(segment, 'start', 0)
-                        end = getattr(segment, 'end', 0)
-                        formatted_text.append(f"[{speaker}] ({start:.1f}s-{end:.1f}s): {text}")
-                    return '\n'.join(formatted_text)
-                else:
-                    return str(transcript)
-            else:
-                return transcript.text if hasattr(transcript, 'text') else transcript
+            # Consultar caché por contenido antes de llamar a la API
+            result = None
+            cache_key = None
+            if self.cache:
+                cache_key = self.cache.make_key(audio, selected_model, response_format)
+                result = self.cache.get(cache_key)
+            
+            if result is None:
+                request_stats = {}
+                result = self._request_transcription(audio, selected_model, response_format, request_stats)
+                if self.cache:
+                    self.cache.put(cache_key, result)
+                if metrics is not None:
+                    metrics.record_request(
+                        bytes_sent=audio.size,
+                        audio_sec=duration_sec,
+                        latency_sec=request_stats["latency_sec"],
+                        retries=request_stats["retries"],
+                        throttle_sec=request_stats["throttle_sec"],
+                    )
+            elif metrics is not None:
+                metrics.record_cache_hit()
+            
+            return rebase_result(result, offset_sec)
             
         except Exception as e:
             raise Exception(f"Error en transcripción: {str(e)}")
     
+    def _request_transcription(self, audio, selected_model, response_format, request_stats=None):
+        """
+        Envía el audio (AudioBuffer) a la API y normaliza la respuesta.
+        
+        Returns:
+            Diccionario {"text": ...} o {"segments": [...]} para diarización
+        """
+        with audio.open() as audio_file:
+            # Configurar parámetros según el modelo
+            params = {
+                "model": selected_model,
+                "file": audio_file,
+                "response_format": response_format
+            }
+            
+            # Para modelos de diarización, añadir chunking_strategy
+            if "diarize" in selected_model:
+                params["chunking_strategy"] = "auto"
+            
+            transcript = self._create_with_backoff(params, request_stats)
+        
+        # Manejar diferentes formatos de respuesta
+        if "diarize" in selected_model:
+            if hasattr(transcript, 'segments'):
+                segments = []
+                for segment in transcript.segments:
+                    segments.append({
+                        "speaker": getattr(segment, 'speaker', 'Unknown'),
+                        "start": getattr(segment, 'start', 0),
+                        "end": getattr(segment, 'end', 0),
+                        "text": getattr(segment, 'text', ''),
+                    })
+                return {"segments": segments}
+            return {"text": str(transcript)}
+        
+        return {"text": transcript.text if hasattr(transcript, 'text') else transcript}
+    
+    def format_result(self, result):
+        """Convierte el resultado normalizado al texto que se guarda en outputs/"""
+        if "segments" in result:
+            # Para diarización, formatear los segmentos
+            formatted_text = []
+            for segment in result["segments"]:
+                formatted_text.append(
+                    f"[{segment['speaker']}] ({segment['start']:.1f}s-{segment['end']:.1f}s): {segment['text']}"
+                )
+            return '\n'.join(formatted_text)
+        return result["text"]
+    
+    def transcribe_chunks(self, chunk_paths, model=None, max_workers=None, offsets=None, on_result=None,
+                          durations=None, metrics=None):
+        """
+        Transcribe varios chunks en paralelo con un límite de concurrencia.
+        
+        Args:
+            chunk_paths: Rutas o AudioBuffer de los chunks
+            offsets: Inicio (s) de cada chunk en la grabación original, para reubicar timestamps
+            on_result: Callback opcional on_result(posición, resultado) al terminar cada chunk
+            durations: Duración (s) de cada chunk, para estimar el coste
+            metrics: ModelMetrics opcional compartido por todos los chunks
+        
+        Returns:
+            Lista de resultados normalizados en el mismo orden que chunk_paths
+        """
+        max_workers = max_workers or Config.MAX_CONCURRENT_REQUESTS
+        offsets = offsets or [0.0] * len(chunk_paths)
+        durations = durations or [0.0] * len(chunk_paths)
+        total = len(chunk_paths)
+        
+        def transcribe_one(index, chunk_path):
+            result = self.transcribe_segments(chunk_path, model=model, offset_sec=offsets[index - 1],
+                                              duration_sec=durations[index - 1], metrics=metrics)
+            if on_result:
+                on_result(index - 1, result)
+            print(f"      ✅ Chunk {index}/{total}")
+            return result
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+            futures = [
+                executor.submit(transcribe_one, i, chunk_path)
+                for i, chunk_path in enumerate(chunk_paths, 1)
+            ]
+            # Reensamblar en orden de chunk, no en orden de finalización
+            return [future.result() for future in futures]
+    
     def save_transcription(self, transcription, output_path):
         """Guarda la transcripción en un archivo"""
         try:
@@ -62,4 +223,22 @@ class OpenAITranscriptionService:
                 f.write(transcription)
             return True
         except Exception as e:
-            raise Exception(f"Error guardando transcripción: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error guardando transcripción: {str(e)}")
+    
+    def save_segments(self, result, output_path):
+        """
+        Guarda los segmentos diarizados en JSONL junto a la transcripción.
+        
+        Returns:
+            Ruta del archivo de segmentos, o None si el resultado no tiene segmentos
+        """
+        if "segments" not in result:
+            return None
+        segments_path = Path(output_path).with_suffix(Config.SEGMENTS_SUFFIX)
+        try:
+            with open(segments_path, 'w', encoding='utf-8') as f:
+                for segment in result["segments"]:
+                    f.write(json.dumps(segment, ensure_ascii=False) + "\n")
+            return segments_path
+        except Exception as e:
+            raise Exception(f"Error guardando segmentos: {str(e)}")
@@ -0,0 +1,378 @@
+"""
+Pipeline por etapas para procesar lotes de audio
+Solapa el trabajo de CPU (decodificación/exportación con ffmpeg) con la subida a la API
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from audio_processor import SILENCE_FRAME_MS, AudioProcessor, plan_signature
+from config import Config
+from job_journal import JobJournal
+from metrics import RunMetrics, timed
+from scratch import ScratchSpace, remove_dir
+from stitcher import stitch_results
+
+# Marca de fin de cola para los hilos de subida
+_END = object()
+
+
+def prepare_and_split(audio_file, scratch, windows=None, skip_indices=(), vad=False, media_index=None):
+    """
+    Etapa de CPU: prepara, recorta pausas (si VAD está activado) y divide un archivo de audio.
+    Se ejecuta en un proceso hijo, por eso crea su propio AudioProcessor
+    y devuelve los tiempos de cada etapa junto con los chunks.
+
+    Los chunks vuelven en memoria; los temporales en disco quedan en un directorio propio
+    dentro de scratch, que se borra aquí si algo falla y en la etapa de subida si no.
+    Con media_index se reutilizan el probe, la envolvente del VAD y los cortes de una
+    ejecución anterior, y se guardan los que se calculen ahora.
+
+    Args:
+        scratch: ScratchSpace de la ejecución
+        vad: Recortar las pausas largas (se pasa explícito: el proceso hijo no ve cambios en Config)
+        media_index: MediaIndex opcional
+
+    Returns:
+        (info, chunks, tiempos por etapa, OffsetMap o None, directorio de trabajo)
+    """
+    audio_processor = AudioProcessor(work_dir=scratch.make_dir(), media_index=media_index)
+    try:
+        prepared_file, info = audio_processor.prepare_for_transcription(audio_file)
+        # Archivos intermedios (AAC reempaquetado, audio recortado) que no sobreviven a la división
+        intermediates = [prepared_file] if prepared_file != str(audio_file) else []
+        # Se indexa el original; su probe solo sirve si se divide el propio original
+        probe = audio_processor.probe_source(audio_file) if media_index is not None else None
+        if intermediates:
+            probe = None
+
+        offset_map = None
+        if vad:
+            envelope = media_index.get_envelope(audio_file, SILENCE_FRAME_MS) if media_index else None
+            if envelope is None:
+                with timed(audio_processor.timings, "vad"):
+                    envelope = audio_processor.stream_envelope(prepared_file)
+                if media_index is not None:
+                    media_index.put_envelope(audio_file, SILENCE_FRAME_MS, envelope)
+            trimmed = audio_processor.trim_silence(prepared_file, envelope=envelope)
+            if trimmed is not None:
+                prepared_file, offset_map = trimmed
+                intermediates.append(prepared_file)
+                probe = None
+
+        new_plan = windows is None
+        if new_plan and media_index is not None:
+            # Cortes ya buscados en silencio en una ejecución anterior con los mismos ajustes
+            windows = media_index.get_plan(audio_file, plan_signature(vad))
+            new_plan = windows is None
+        chunks = audio_processor.split_large_audio(prepared_file, windows=windows, skip_indices=skip_indices,
+                                                   probe=probe)
+        if new_plan and media_index is not None:
+            media_index.put_plan(audio_file, plan_signature(vad),
+                                 [(chunk["start_ms"], chunk["end_ms"]) for chunk in chunks])
+    except BaseException:
+        audio_processor.cleanup_work_dir()
+        raise
+
+    # Sin división el intermedio es el propio chunk y se sube desde disco
+    uploaded = {chunk["audio"].path for chunk in chunks if chunk["audio"] is not None}
+    for path in intermediates:
+        if path not in uploaded:
+            os.remove(path)
+    return info, chunks, audio_processor.timings, offset_map, audio_processor.work_dir
+
+
+class TranscriptionPipeline:
+    """
+    Pipeline de dos etapas unidas por una cola acotada:
+    - Decodificación: pool de procesos (pydub/ffmpeg)
+    - Subida: hilos que envían los chunks a la API
+
+    Mientras se suben los chunks del archivo N, el archivo N+1 ya se está decodificando.
+    Con varios modelos, cada archivo se divide una sola vez y los modelos suben en paralelo.
+    """
+
+    def __init__(self, audio_processor, transcription_service, models,
+                 decode_workers=None, upload_workers=None, queue_size=None, resume=False, transcript_index=None):
+        """
+        Args:
+            models: Lista de (nombre del modelo, nombre visible)
+            transcript_index: TranscriptIndex opcional donde se indexa cada transcripción al guardarla
+        """
+        self.audio_processor = audio_processor
+        self.transcription_service = transcription_service
+        self.models = models
+        self.resume = resume
+        self.transcript_index = transcript_index
+        self.decode_workers = decode_workers or Config.PIPELINE_DECODE_WORKERS
+        self.upload_workers = upload_workers or Config.PIPELINE_UPLOAD_WORKERS
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.metrics = RunMetrics()
+
+    def run(self, audio_files):
+        """
+        Procesa todos los archivos a través del pipeline.
+
+        Returns:
+            Diccionario con contadores por transcripción (archivo y modelo): completed, skipped, failed.
+            Los tiempos, la latencia y el coste quedan en self.metrics
+        """
+        self.start()
+        try:
+            total = len(audio_files)
+            for i, audio_file in enumerate(audio_files, 1):
+                self.submit(audio_file, label=f"({i}/{total}) ")
+        except BaseException:
+            self._abort()
+            raise
+        return self.close()
+
+    @property
+    def capacity(self):
+        """Archivos que pueden estar en curso sin que submit() se bloquee"""
+        return self.queue_size + self.upload_workers
+
+    def start(self):
+        """Arranca los hilos de subida y el pool de decodificación"""
+        self.metrics = RunMetrics()
+        self.stats = {"completed": 0, "skipped": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+        # La cola acotada limita cuántos archivos decodificados esperan subida
+        # (y por tanto cuánta memoria ocupan sus chunks: CHUNK_MEMORY_BUDGET_MB por archivo)
+        self._pending = queue.Queue(maxsize=self.queue_size)
+        self._uploaders = [
+            threading.Thread(target=self._upload_worker, args=(self._pending, self._count), daemon=True)
+            for _ in range(self.upload_workers)
+        ]
+        for thread in self._uploaders:
+            thread.start()
+        self._executor = ProcessPoolExecutor(max_workers=self.decode_workers)
+        # Temporales de la ejecución (también los de los procesos de decodificación)
+        self.scratch = ScratchSpace().open()
+
+    def submit(self, audio_file, label="", force=False, on_done=None):
+        """
+        Encola un archivo: se decodifica en el pool y se sube en cuanto haya un hilo libre.
+
+        Args:
+            label: Prefijo de los mensajes (p. ej. "(3/10) ")
+            force: Transcribir aunque ya existan las salidas (el audio cambió)
+            on_done: Callback on_done(audio_file, error) al terminar todos los modelos;
+                     error es None si todo fue bien
+
+        Returns:
+            False si no había nada que hacer (todas las transcripciones existen)
+        """
+        targets = self._pending_targets(audio_file, force=force)
+        skipped = len(self.models) - len(targets)
+        if skipped:
+            self._count("skipped", skipped)
+        if not targets:
+            print(f"   ⚠️  {label}Ya existen todas las transcripciones: {audio_file.name}")
+            if on_done:
+                on_done(audio_file, None)
+            return False
+
+        windows, done = self._resume_plan(audio_file, targets)
+        if windows is not None:
+            print(f"🔁 {label}Reanudando: {audio_file.name} "
+                  f"({len(done)}/{len(windows)} chunks ya transcritos)")
+            future = self._executor.submit(prepare_and_split, audio_file, self.scratch, windows, done,
+                                         Config.VAD_ENABLED, self.audio_processor.media_index)
+        else:
+            print(f"🔄 {label}Decodificando: {audio_file.name}")
+            future = self._executor.submit(prepare_and_split, audio_file, self.scratch, vad=Config.VAD_ENABLED,
+                                         media_index=self.audio_processor.media_index)
+        file_metrics = self.metrics.add_file(audio_file, [target["model"] for target in targets])
+        # Bloquea si la etapa de subida va atrasada (backpressure)
+        self._pending.put((audio_file, targets, future, file_metrics, on_done))
+        return True
+
+    def close(self):
+        """Espera a que terminen los archivos encolados y libera los workers"""
+        try:
+            for _ in self._uploaders:
+                self._pending.put(_END)
+            for thread in self._uploaders:
+                thread.join()
+        except BaseException:
+            # Ctrl+C (o un fallo) durante la espera, que es donde pasa el tiempo una ejecución larga
+            self._abort()
+            raise
+        try:
+            self._executor.shutdown()
+        finally:
+            self.scratch.close()
+        self.metrics.finish()
+        return self.stats
+
+    def _abort(self):
+        """Cancela las decodificaciones pendientes y borra los temporales de la ejecución"""
+        try:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        finally:
+            self.scratch.close()
+
+    def _index_transcript(self, output_path, result):
+        """Indexa la transcripción recién guardada; un fallo del índice no invalida la transcripción"""
+        if self.transcript_index is None:
+            return
+        try:
+            self.transcript_index.index_file(output_path, result.get("segments"))
+        except Exception as e:
+            print(f"   ⚠️  No se pudo indexar {output_path.name}: {str(e)}")
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _pending_targets(self, audio_file, force=False):
+        """Modelos que aún no tienen transcripción para este archivo (todos con force)"""
+        targets = []
+        for model, model_display in self.models:
+            output_path = self.audio_processor.get_transcription_output_path(audio_file, model)
+            if output_path.exists() and not force:
+                print(f"   ⚠️  Ya existe transcripción: {output_path.name}")
+                continue
+            targets.append({
+                "model": model,
+                "display": model_display,
+                "output_path": output_path,
+                "journal": JobJournal(output_path),
+            })
+        return targets
+
+    def _resume_plan(self, audio_file, targets):
+        """
+        Plan compartido para reanudar: el del primer diario válido.
+        Solo se omiten los chunks que ya terminaron todos los modelos.
+
+        Returns:
+            (windows, índices a omitir) o (None, ()) si se empieza de cero
+        """
+        if not self.resume:
+            return None, ()
+
+        windows = None
+        for target in targets:
+            if target["journal"].load(audio_file, target["model"]) and windows is None:
+                windows = target["journal"].windows
+        if windows is None:
+            return None, ()
+
+        done_sets = []
+        for target in targets:
+            journal = target["journal"]
+            if journal.data is not None and journal.windows != windows:
+                # Plan distinto al compartido: este modelo empieza de cero
+                journal.data = None
+            done_sets.append(journal.done_indices() if journal.data is not None else set())
+        return windows, set.intersection(*done_sets)
+
+    def _upload_worker(self, pending, count):
+        """Etapa de red: espera el resultado de la decodificación y sube los chunks de cada modelo"""
+        while True:
+            item = pending.get()
+            if item is _END:
+                return
+
+            audio_file, targets, future, file_metrics, on_done = item
+            try:
+                # Tiempo que la subida espera a ffmpeg: si crece, el cuello de botella es la CPU
+                with timed(file_metrics.timings, "decode_wait"):
+                    info, chunks, split_timings, offset_map, work_dir = future.result()
+            except Exception as e:
+                print(f"   ❌ Error procesando {audio_file.name}: {str(e)}")
+                for model_metrics in file_metrics.models.values():
+                    model_metrics.status, model_metrics.error = "failed", str(e)
+                count("failed", len(targets))
+                if on_done:
+                    on_done(audio_file, e)
+                continue
+
+            file_metrics.timings.update(split_timings)
+            file_metrics.num_chunks = len(chunks)
+            file_metrics.duration_sec = chunks[-1]["end_ms"] / 1000
+            if offset_map is not None:
+                file_metrics.duration_sec = offset_map.original_ms / 1000
+                file_metrics.silence_removed_sec = offset_map.removed_ms / 1000
+
+            print(f"   📄 {audio_file.name}: {info}, {len(chunks)} chunk(s)")
+            error = None
+            try:
+                # Los modelos comparten los mismos chunks y suben en paralelo
+                with ThreadPoolExecutor(max_workers=len(targets)) as model_executor:
+                    futures = [
+                        (target, model_executor.submit(self._transcribe_file, audio_file, target, chunks,
+                                                       file_metrics.models[target["model"]], offset_map))
+                        for target in targets
+                    ]
+                    for target, model_future in futures:
+                        model_metrics = file_metrics.models[target["model"]]
+                        try:
+                            model_future.result()
+                            model_metrics.status = "completed"
+                            count("completed")
+                        except Exception as e:
+                            print(f"   ❌ Error procesando {audio_file.name} ({target['display']}): {str(e)}")
+                            model_metrics.status, model_metrics.error = "failed", str(e)
+                            count("failed")
+                            error = error or e
+            finally:
+                # Liberar los chunks (memoria y disco) cuando todos los modelos terminaron
+                remove_dir(work_dir)
+                for chunk in chunks:
+                    # El future sigue guardando la lista hasta el siguiente archivo
+                    chunk["audio"] = None
+            if on_done:
+                on_done(audio_file, error)
+
+    def _transcribe_file(self, audio_file, target, chunks, model_metrics, offset_map=None):
+        """
+        Transcribe los chunks pendientes de un archivo con un modelo y guarda el resultado.
+
+        Args:
+            offset_map: OffsetMap si se recortaron pausas; los timestamps vuelven a la grabación original
+        """
+        model = target["model"]
+        journal = target["journal"]
+        output_path = target["output_path"]
+        if journal.data is None:
+            # Registrar el plan antes de subir nada: un corte solo cuesta los chunks en curso
+            journal.start(audio_file, model, chunks)
+
+        done = journal.done_indices()
+        pending = [chunk for chunk in chunks if chunk["audio"] is not None and chunk["index"] not in done]
+        model_metrics.resumed_chunks = len(done)
+        with timed(model_metrics.timings, "upload"):
+            if len(chunks) == 1 and pending:
+                # Archivo pequeño, transcripción directa
+                print(f"   🤖 Enviando {audio_file.name} a {target['display']}...")
+                result = self.transcription_service.transcribe_segments(
+                    pending[0]["audio"], model=model,
+                    duration_sec=(pending[0]["end_ms"] - pending[0]["start_ms"]) / 1000, metrics=model_metrics
+                )
+                journal.mark_done(1, result)
+            elif pending:
+                # Archivo grande, transcribir por chunks (timestamps reubicados con el inicio de cada chunk)
+                print(f"   🤖 Transcribiendo {len(pending)} chunks de {audio_file.name} con {target['display']}...")
+                self.transcription_service.transcribe_chunks(
+                    [chunk["audio"] for chunk in pending], model=model,
+                    offsets=[chunk["start_ms"] / 1000 for chunk in pending],
+                    on_result=lambda position, result: journal.mark_done(pending[position]["index"], result),
+                    durations=[(chunk["end_ms"] - chunk["start_ms"]) / 1000 for chunk in pending],
+                    metrics=model_metrics
+                )
+
+        # Combinar resultados (incluye los de ejecuciones anteriores) quitando duplicados en las costuras
+        with timed(model_metrics.timings, "postprocess"):
+            merged = stitch_results(journal.results(), overlap_sec=Config.CHUNK_OVERLAP_SEC)
+            if offset_map is not None:
+                merged = offset_map.remap_result(merged)
+            transcription = self.transcription_service.format_result(merged)
+            self.transcription_service.save_transcription(transcription, output_path)
+            self.transcription_service.save_segments(merged, output_path)
+            self._index_transcript(output_path, merged)
+        journal.finish()
+        print(f"   ✅ Transcripción guardada: {output_path.name}")
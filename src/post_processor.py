@@ -1,25 +1,101 @@
 """
 Post-procesador para mejorar transcripciones diarizadas
-Combina transcripción standard (alta calidad) con diarization (speakers + timestamps)
+Combina transcripción standard (alta calidad) con diarization (speakers + timestamps),
+con un alineador local o, opcionalmente, con GPT-4o
 """
 
-from openai import OpenAI
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
 from pathlib import Path
 from config import Config
+from aligner import align_transcripts
+from api_client import OpenAIBackend
+
+# Línea de diarización: [A] (0.0s-4.2s): texto
+DIARIZATION_LINE = re.compile(r"^\[(?P<speaker>[^\]]+)\]\s*\((?P<start>[\d.]+)s?-(?P<end>[\d.]+)s?\):\s*(?P<text>.*)$")
+
+# Palabras a cada lado del punto estimado donde se busca la frontera real entre ventanas
+BOUNDARY_BAND_WORDS = 150
+
+
+def parse_diarization(diarization_text):
+    """Convierte las líneas '[speaker] (start-end): texto' en segmentos"""
+    segments = []
+    for line in diarization_text.splitlines():
+        match = DIARIZATION_LINE.match(line.strip())
+        if match:
+            segments.append({
+                "speaker": match.group("speaker"),
+                "start": float(match.group("start")),
+                "end": float(match.group("end")),
+                "text": match.group("text"),
+            })
+    return segments
+
+
+def diarization_lines(segments):
+    """Formato de la transcripción diarizada: una línea '[speaker] (start-end): texto' por segmento"""
+    return "\n".join(
+        f"[{segment['speaker']}] ({segment['start']:.1f}s-{segment['end']:.1f}s): {segment['text']}"
+        for segment in segments
+    )
+
+
+def load_segments(diarization_file):
+    """
+    Lee los segmentos de una transcripción diarizada.
+    Usa el JSONL estructurado si existe; si no, interpreta el texto.
+    """
+    diarization_file = Path(diarization_file)
+    segments_file = diarization_file.with_suffix(Config.SEGMENTS_SUFFIX)
+    if segments_file.exists():
+        with open(segments_file, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return parse_diarization(diarization_file.read_text(encoding='utf-8'))
+
+
+def format_segments(segments):
+    """Formato de salida '[speaker] (start-end): texto', una intervención por párrafo"""
+    return "\n\n".join(
+        f"[{segment['speaker']}] ({segment['start']:.0f}s-{segment['end']:.0f}s): {segment['text']}"
+        for segment in segments
+    )
+
+
+def _normalize_words(words):
+    return [re.sub(r"[^\w]+", "", word.lower()) for word in words]
 
 
 class DiarizationImprover:
-    def __init__(self):
-        if not Config.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY no encontrada en las variables de entorno")
-        self.client = OpenAI()
+    def __init__(self, use_llm: bool = False, backend=None, transcript_index=None):
+        """
+        Args:
+            use_llm: Usar GPT-4o para la fusión; por defecto se usa el alineador local (sin API)
+            backend: TranscriptionBackend para el LLM (por defecto la API de OpenAI con el cliente compartido)
+            transcript_index: TranscriptIndex opcional: lista los archivos a mejorar e indexa las versiones mejoradas
+        """
+        self.use_llm = use_llm
+        self.transcript_index = transcript_index
+        self.backend = None
+        if use_llm:
+            self.backend = backend or OpenAIBackend()
 
-    def improve_diarization(self, standard_text: str, diarization_text: str) -> str:
+    def improve_local(self, standard_text: str, segments: list) -> str:
+        """
+        Fusión determinista sin API: alinea palabras para asignar speakers y timestamps
+        al texto standard y agrupa cada intervención en un párrafo.
+        """
+        return format_segments(align_transcripts(standard_text, segments))
+
+    def improve_diarization(self, standard_text: str, diarization_text: str,
+                            context: str = "", max_tokens: int = 16000) -> str:
         """
         Combina transcripción standard con diarization para producir
         una versión mejorada con speakers y texto fluido.
         """
-        prompt = f"""Tienes dos transcripciones del mismo audio:
+        prompt = f"""{context}Tienes dos transcripciones del mismo audio:
 
 1. TRANSCRIPCIÓN STANDARD (texto de alta calidad, sin speakers):
 {standard_text}
@@ -47,18 +123,129 @@ IMPORTANTE:
 - Usa el texto de STANDARD, solo toma la información de speakers de DIARIZACIÓN
 - Si hay dudas sobre qué speaker dijo algo, usa el contexto para inferir"""
 
-        response = self.client.chat.completions.create(
+        response = self.backend.complete(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "Eres un experto en edición de transcripciones. Tu trabajo es combinar información de múltiples fuentes para producir transcripciones de alta calidad."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=16000
+            max_tokens=max_tokens
         )
 
         return response.choices[0].message.content
 
+    def split_windows(self, standard_text: str, segments: list, window_sec: float) -> list:
+        """
+        Divide ambas transcripciones en ventanas alineadas.
+
+        Los segmentos diarizados se agrupan por tiempo. La frontera correspondiente en el
+        texto standard se estima por posición (proporción de palabras) y se ajusta
+        alineando las palabras alrededor de la estimación.
+
+        Returns:
+            Lista de (texto standard, segmentos diarizados) por ventana
+        """
+        # Agrupar segmentos por tiempo
+        groups = []
+        for segment in segments:
+            if not groups or segment["start"] >= groups[-1][0]["start"] + window_sec:
+                groups.append([])
+            groups[-1].append(segment)
+
+        std_words = standard_text.split()
+        std_norm = _normalize_words(std_words)
+        diar_words = [word for segment in segments for word in segment["text"].split()]
+        diar_norm = _normalize_words(diar_words)
+        ratio = len(std_words) / max(len(diar_words), 1)
+
+        windows = []
+        std_start = 0
+        diar_end = 0
+        for i, group in enumerate(groups):
+            diar_end += sum(len(segment["text"].split()) for segment in group)
+            if i == len(groups) - 1:
+                std_end = len(std_words)
+            else:
+                estimate = int(diar_end * ratio)
+                std_end = self._align_boundary(std_norm, diar_norm, diar_end, estimate, std_start)
+            windows.append((" ".join(std_words[std_start:std_end]), group))
+            std_start = std_end
+        return windows
+
+    def _align_boundary(self, std_norm, diar_norm, diar_index, estimate, minimum):
+        """Busca en el texto standard la posición que corresponde a diar_index en la diarización"""
+        band_start = max(minimum, estimate - BOUNDARY_BAND_WORDS)
+        band_end = min(len(std_norm), estimate + BOUNDARY_BAND_WORDS)
+        diar_start = max(0, diar_index - BOUNDARY_BAND_WORDS)
+        diar_stop = min(len(diar_norm), diar_index + BOUNDARY_BAND_WORDS)
+
+        matcher = SequenceMatcher(None, diar_norm[diar_start:diar_stop], std_norm[band_start:band_end], autojunk=False)
+        # Tomar el bloque coincidente más cercano a la frontera de la diarización
+        best = None
+        for a, b, size in matcher.get_matching_blocks():
+            if size == 0:
+                continue
+            distance = abs(diar_start + a - diar_index)
+            if diar_start + a <= diar_index < diar_start + a + size:
+                distance = 0
+            if best is None or distance < best[0]:
+                best = (distance, band_start + b + (diar_index - diar_start - a))
+        if best is None:
+            return max(minimum, min(estimate, len(std_norm)))
+        return max(minimum, min(best[1], len(std_norm)))
+
+    def improve_windowed(self, standard_text: str, segments: list, window_sec: float = None) -> str:
+        """
+        Versión map-reduce: mejora ventanas alineadas en paralelo y las une.
+        La latencia depende del tamaño de ventana, no de la duración de la entrevista.
+        """
+        window_sec = window_sec or Config.IMPROVE_WINDOW_SEC
+        windows = self.split_windows(standard_text, segments, window_sec)
+        speakers = sorted({segment["speaker"] for segment in segments})
+        print(f"   🪟 {len(windows)} ventanas de ~{window_sec / 60:.0f} min "
+              f"({Config.IMPROVE_CONCURRENCY} en paralelo)")
+
+        def improve_one(index, window):
+            standard_part, group = window
+            context = (
+                f"Este es el fragmento {index + 1} de {len(windows)} de una entrevista larga "
+                f"({group[0]['start']:.0f}s-{group[-1]['end']:.0f}s). "
+                f"Speakers de toda la entrevista: {', '.join(speakers)}. "
+                f"Conserva exactamente estas etiquetas y los timestamps absolutos.\n\n"
+            )
+            return self.improve_diarization(
+                standard_part, diarization_lines(group),
+                context=context, max_tokens=Config.IMPROVE_WINDOW_MAX_TOKENS
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, Config.IMPROVE_CONCURRENCY)) as executor:
+            parts = list(executor.map(improve_one, range(len(windows)), windows))
+
+        return self.stitch_windows(parts)
+
+    def stitch_windows(self, parts: list) -> str:
+        """Une las ventanas mejoradas fusionando la intervención partida en cada frontera"""
+        merged = []
+        for part in parts:
+            segments = parse_diarization(part.replace("\n\n", "\n"))
+            if not segments:
+                # Respuesta sin el formato esperado: conservarla tal cual
+                merged.append({"raw": part.strip()})
+                continue
+            first = segments[0]
+            last = merged[-1] if merged else None
+            if last and "raw" not in last and last["speaker"] == first["speaker"]:
+                # Mismo speaker a ambos lados de la frontera: un solo párrafo
+                last["end"] = first["end"]
+                last["text"] = f"{last['text']} {first['text']}"
+                segments = segments[1:]
+            merged.extend(segments)
+
+        return "\n\n".join(
+            item["raw"] if "raw" in item else format_segments([item]) for item in merged
+        )
+
     def process_files(self, base_name: str) -> str:
         """
         Procesa archivos de transcripción existentes y genera versión mejorada.
@@ -85,22 +272,63 @@ IMPORTANTE:
         if output_file.exists():
             raise FileExistsError(f"Ya existe: {output_file}")
 
-        # Leer archivos
+        # Leer archivos (segmentos estructurados si existen, sin reinterpretar el texto)
         standard_text = standard_file.read_text(encoding='utf-8')
-        diarization_text = diarization_file.read_text(encoding='utf-8')
+        segments = load_segments(diarization_file)
+        # Sin segmentos la salida quedaría vacía y, al existir, el archivo no se volvería a ofrecer
+        if not segments:
+            raise ValueError(f"No hay segmentos diarizados en: {diarization_file}")
+        if not standard_text.strip():
+            raise ValueError(f"La transcripción standard está vacía: {standard_file}")
+
+        print(f"   📄 {base_name}: standard {len(standard_text)} caracteres, {len(segments)} segmentos diarizados")
 
-        print(f"   📄 Standard: {len(standard_text)} caracteres")
-        print(f"   📄 Diarization: {len(diarization_text)} caracteres")
+        duration = segments[-1]["end"] if segments else 0
+        if not self.use_llm:
+            # Alineación local (sin API)
+            improved_text = self.improve_local(standard_text, segments)
+        elif duration > Config.IMPROVE_WINDOW_SEC:
+            # Procesar con GPT-4o por ventanas (entrevista larga)
+            print(f"   🤖 {base_name}: GPT-4o por ventanas ({duration / 60:.0f} min)...")
+            improved_text = self.improve_windowed(standard_text, segments)
+        else:
+            print(f"   🤖 {base_name}: procesando con GPT-4o...")
+            improved_text = self.improve_diarization(standard_text, diarization_lines(segments))
 
-        # Procesar con GPT-4o
-        print(f"   🤖 Procesando con GPT-4o...")
-        improved_text = self.improve_diarization(standard_text, diarization_text)
+        if not improved_text.strip():
+            raise ValueError(f"La mejora de {base_name} no produjo texto; no se guarda {output_file.name}")
 
         # Guardar resultado
         output_file.write_text(improved_text, encoding='utf-8')
+        if self.transcript_index is not None:
+            try:
+                self.transcript_index.index_file(output_file)
+            except Exception as e:
+                print(f"   ⚠️  No se pudo indexar {output_file.name}: {str(e)}")
 
         return str(output_file)
 
+    def process_many(self, base_names: list, max_workers: int = None) -> dict:
+        """
+        Procesa varios archivos en paralelo con un límite de concurrencia.
+
+        Returns:
+            Diccionario nombre -> ruta de salida o excepción
+        """
+        max_workers = max_workers or Config.IMPROVE_FILE_CONCURRENCY
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(base_names) or 1))) as executor:
+            futures = {executor.submit(self.process_files, name): name for name in base_names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                    print(f"   ✅ Guardado: {Path(results[name]).name}")
+                except Exception as e:
+                    results[name] = e
+                    print(f"   ❌ {name}: {e}")
+        return results
+
     def list_improvable_files(self) -> list:
         """
         Lista los archivos que tienen tanto standard como diarization disponibles.
@@ -108,6 +336,11 @@ IMPORTANTE:
         Returns:
             Lista de nombres base que pueden ser mejorados
         """
+        if self.transcript_index is not None:
+            # Consulta al índice tras recoger los archivos que cambiaron fuera del transcriptor
+            self.transcript_index.sync()
+            return self.transcript_index.improvable_bases()
+
         output_dir = Path(Config.OUTPUT_DIR)
 
         # Buscar archivos _standard.txt
@@ -0,0 +1,122 @@
+"""
+Buffers de audio y área de trabajo temporal gestionada
+Los chunks se codifican en memoria y se suben sin pasar por disco. Lo que no cabe
+(y los intermedios que ffmpeg necesita como archivo: AAC reempaquetado, audio recortado)
+va a SCRATCH_DIR/run-<pid>/, con un subdirectorio por archivo de audio que se borra entero
+al terminar ese archivo. El de la ejecución se borra al cerrar el pipeline (con éxito, error
+o Ctrl+C) y los de ejecuciones que murieron sin limpiar (kill -9) al arrancar la siguiente
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from config import Config
+
+
+class AudioBuffer:
+    """Audio listo para subir: bytes en memoria o un archivo en disco"""
+
+    def __init__(self, name, data=None, path=None):
+        """
+        Args:
+            name: Nombre con extensión que se envía a la API (deduce el formato de ella)
+            data: Contenido codificado en memoria
+            path: Archivo en disco (original o volcado al área de trabajo) si no hay data
+        """
+        self.name = name
+        self.data = data
+        self.path = str(path) if path is not None else None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(Path(path).name, path=path)
+
+    @property
+    def in_memory(self):
+        return self.data is not None
+
+    @property
+    def size(self):
+        return len(self.data) if self.in_memory else os.path.getsize(self.path)
+
+    def open(self):
+        """Archivo binario de lectura (con .name, como espera el cliente HTTP)"""
+        if not self.in_memory:
+            return open(self.path, "rb")
+        stream = io.BytesIO(self.data)
+        stream.name = self.name
+        return stream
+
+
+def as_audio_buffer(audio):
+    """Acepta una ruta o un AudioBuffer"""
+    return audio if isinstance(audio, AudioBuffer) else AudioBuffer.from_file(audio)
+
+
+def remove_dir(path):
+    """Borra un directorio de trabajo (sin error si ya no existe)"""
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def pid_alive(pid):
+    """True si existe un proceso con ese pid en esta máquina"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchSpace:
+    """Directorio de trabajo de una ejecución: SCRATCH_DIR/run-<pid>/"""
+
+    def __init__(self, root=None):
+        self.root = Path(root or Config.SCRATCH_DIR)
+        # Se fija en el proceso principal: los procesos de decodificación trabajan dentro
+        self.path = self.root / f"run-{os.getpid()}"
+
+    def open(self):
+        removed = self.sweep()
+        if removed:
+            print(f"🧹 {removed} directorio(s) temporal(es) de ejecuciones anteriores eliminado(s)")
+        self.path.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def sweep(self):
+        """
+        Borra los directorios de ejecuciones cuyo proceso ya no existe.
+
+        Returns:
+            Número de directorios eliminados
+        """
+        removed = 0
+        if not self.root.is_dir():
+            return removed
+        for entry in self.root.glob("run-*"):
+            try:
+                pid = int(entry.name[len("run-"):])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not pid_alive(pid):
+                remove_dir(entry)
+                removed += 1
+        return removed
+
+    def make_dir(self, prefix="file-"):
+        """Subdirectorio nuevo para los temporales de un archivo de audio"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        return tempfile.mkdtemp(prefix=prefix, dir=self.path)
+
+    def close(self):
+        remove_dir(self.path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
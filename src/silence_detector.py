@@ -0,0 +1,114 @@
+"""
+Detección de silencios vectorizada con NumPy
+Calcula la envolvente de energía una sola vez sobre las muestras y busca el punto más silencioso
+"""
+
+import numpy as np
+
+# Tipos de muestra según sample_width de pydub
+_SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def samples_as_array(segment):
+    """Devuelve las muestras de un AudioSegment como array mono float32 (sin copias intermedias)"""
+    dtype = _SAMPLE_DTYPES.get(segment.sample_width)
+    if dtype is None:
+        raise ValueError(f"Ancho de muestra no soportado: {segment.sample_width}")
+
+    samples = np.frombuffer(segment.raw_data, dtype=dtype).astype(np.float32)
+    if segment.channels > 1:
+        usable = len(samples) - len(samples) % segment.channels
+        samples = samples[:usable].reshape(-1, segment.channels).mean(axis=1)
+    return samples
+
+
+def energy_envelope(segment, frame_ms=10):
+    """
+    Envolvente de energía RMS en dBFS por frame.
+
+    Returns:
+        Array con un valor en dBFS por cada frame de frame_ms milisegundos
+    """
+    samples = samples_as_array(segment)
+    frame_len = max(1, int(segment.frame_rate * frame_ms / 1000))
+    return envelope_from_samples(samples, frame_len, segment.sample_width)
+
+
+def envelope_from_samples(samples, frame_len, sample_width=2):
+    """Envolvente RMS en dBFS de un array de muestras mono (frames completos de frame_len)"""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.array([], dtype=np.float32)
+
+    frames = np.asarray(samples[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    max_amplitude = float(1 << (8 * sample_width - 1))
+    return 20 * np.log10(np.maximum(rms, 1e-9) / max_amplitude)
+
+
+def find_quietest_point(envelope_db, frame_ms, search_start_ms, search_end_ms, min_silence_ms=300):
+    """
+    Busca el punto de menor energía dentro de [search_start_ms, search_end_ms).
+
+    La energía se promedia en ventanas de min_silence_ms para preferir pausas reales
+    frente a picos aislados. Ante empates se elige el punto más tardío (chunks más largos).
+
+    Returns:
+        Posición en ms (relativa a la envolvente) del centro de la pausa, o None si no hay rango
+    """
+    first = max(0, int(search_start_ms // frame_ms))
+    last = min(len(envelope_db), int(search_end_ms // frame_ms))
+    if last - first <= 0:
+        return None
+
+    # Promedio móvil sobre la potencia lineal (no sobre los dB)
+    window = max(1, int(min_silence_ms // frame_ms))
+    power = 10 ** (envelope_db[first:last] / 10)
+    if window > 1 and len(power) >= window:
+        smoothed = np.convolve(power, np.ones(window) / window, mode="same")
+    else:
+        smoothed = power
+
+    # argmin sobre el array invertido = último mínimo
+    quietest = len(smoothed) - 1 - int(np.argmin(smoothed[::-1]))
+    return int((first + quietest) * frame_ms + frame_ms // 2)
+
+
+def speech_regions(envelope_db, frame_ms, min_silence_ms, keep_silence_ms, margin_db):
+    """
+    Detección de voz por energía: regiones a conservar tras quitar las pausas largas.
+
+    El umbral es adaptativo (suelo de ruido = percentil 10 de la envolvente + margin_db),
+    así funciona igual con grabaciones limpias y con ruido de fondo constante.
+    De cada pausa de al menos min_silence_ms se conserva keep_silence_ms (mitad a cada lado)
+    para que las frases no queden pegadas.
+
+    Returns:
+        Lista de (start_ms, end_ms) en orden, alineados a frame_ms
+    """
+    total = len(envelope_db)
+    if total == 0:
+        return []
+
+    threshold = np.percentile(envelope_db, 10) + margin_db
+    silent = np.concatenate(([False], envelope_db < threshold, [False]))
+    changes = np.flatnonzero(silent[1:] != silent[:-1])
+    min_frames = max(1, int(min_silence_ms // frame_ms))
+    pad_frames = int(keep_silence_ms // frame_ms // 2)
+
+    regions = []
+    cursor = 0
+    for start, end in zip(changes[::2], changes[1::2]):
+        if end - start < min_frames:
+            continue
+        # Silencio al principio o al final de la grabación: se quita entero
+        cut_start = start + pad_frames if start > 0 else start
+        cut_end = end - pad_frames if end < total else end
+        if cut_end <= cut_start:
+            continue
+        if cut_start > cursor:
+            regions.append((int(cursor * frame_ms), int(cut_start * frame_ms)))
+        cursor = cut_end
+    if cursor < total:
+        regions.append((int(cursor * frame_ms), int(total * frame_ms)))
+    return regions
@@ -0,0 +1,200 @@
+"""
+Unión de transcripciones por chunks
+Reubica los timestamps de cada chunk en la línea de tiempo global, elimina
+el texto duplicado en las zonas de solapamiento alineando las palabras y, si se
+quitaron pausas antes de subir (VAD), devuelve los tiempos a la grabación original
+"""
+
+import re
+from bisect import bisect_right
+from difflib import SequenceMatcher
+
+# Palabras por segundo estimadas al buscar el solapamiento (voz rápida, con margen)
+WORDS_PER_SEC = 4
+# Coincidencia mínima (en palabras) para considerar que se encontró la costura
+MIN_SEAM_MATCH_WORDS = 3
+
+_WORD = re.compile(r"\S+")
+_WORD_CLEANUP = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def rebase_result(result, offset_sec):
+    """Desplaza los timestamps de los segmentos de un chunk a la línea de tiempo global"""
+    if "segments" not in result or not offset_sec:
+        return result
+    return {
+        "segments": [
+            dict(segment, start=segment["start"] + offset_sec, end=segment["end"] + offset_sec)
+            for segment in result["segments"]
+        ]
+    }
+
+
+class OffsetMap:
+    """
+    Correspondencia entre la línea de tiempo de un audio recortado (sin pausas largas)
+    y la grabación original, para devolver los timestamps a su posición real
+    """
+
+    def __init__(self, regions, original_ms=None):
+        """
+        Args:
+            regions: Regiones conservadas [(start_ms, end_ms), ...] en la grabación original
+            original_ms: Duración de la grabación original (por defecto, el final de la última región)
+        """
+        self.regions = [tuple(region) for region in regions]
+        self._trimmed_starts = []
+        position = 0
+        for start_ms, end_ms in self.regions:
+            self._trimmed_starts.append(position)
+            position += end_ms - start_ms
+        self.trimmed_ms = position
+        self.original_ms = original_ms if original_ms is not None else (self.regions[-1][1] if self.regions else 0)
+
+    @property
+    def removed_ms(self):
+        return self.original_ms - self.trimmed_ms
+
+    def to_original(self, trimmed_sec, is_end=False):
+        """
+        Convierte un instante del audio recortado al de la grabación original.
+        Un final que cae justo en un corte se queda al final de la región anterior,
+        así un segmento no se extiende sobre la pausa eliminada.
+        """
+        if not self.regions:
+            return trimmed_sec
+        position = trimmed_sec * 1000
+        index = bisect_right(self._trimmed_starts, position) - 1
+        if is_end and index > 0 and position == self._trimmed_starts[index]:
+            index -= 1
+        index = max(index, 0)
+        start_ms, end_ms = self.regions[index]
+        original = start_ms + position - self._trimmed_starts[index]
+        return min(max(original, start_ms), end_ms) / 1000
+
+    def remap_result(self, result):
+        """Devuelve los segmentos de un resultado (ya unido) a los tiempos originales"""
+        if "segments" not in result:
+            return result
+        return {
+            "segments": [
+                dict(segment, start=self.to_original(segment["start"]),
+                     end=self.to_original(segment["end"], is_end=True))
+                for segment in result["segments"]
+            ]
+        }
+
+
+def _as_segments(result):
+    """Vista uniforme: una transcripción de texto plano es un único segmento sin tiempos"""
+    if "segments" in result:
+        return [dict(segment) for segment in result["segments"]]
+    return [{"text": result.get("text", "")}]
+
+
+def _flatten_words(segments):
+    """Lista de (índice de segmento, posición de palabra, palabra normalizada)"""
+    words = []
+    for seg_index, segment in enumerate(segments):
+        for word_index, match in enumerate(_WORD.finditer(segment["text"])):
+            normalized = _WORD_CLEANUP.sub("", match.group().lower())
+            if normalized:
+                words.append((seg_index, word_index, normalized))
+    return words
+
+
+def _find_seam(previous, following, overlap_sec):
+    """
+    Alinea la cola del chunk anterior con la cabeza del siguiente.
+
+    Returns:
+        ((seg, palabra) de corte en previous, (seg, palabra) de inicio en following) o None
+    """
+    window = max(int(overlap_sec * WORDS_PER_SEC * 2), 20)
+    tail = _flatten_words(previous)[-window:]
+    head = _flatten_words(following)[:window]
+    if not tail or not head:
+        return None
+
+    matcher = SequenceMatcher(None, [w[2] for w in tail], [w[2] for w in head], autojunk=False)
+    a, b, size = matcher.find_longest_match(0, len(tail), 0, len(head))
+    if size < MIN_SEAM_MATCH_WORDS:
+        return None
+    return tail[a][:2], head[b][:2]
+
+
+def _word_offset(text, word_index):
+    """Posición (en caracteres) de la palabra número word_index"""
+    for i, match in enumerate(_WORD.finditer(text)):
+        if i == word_index:
+            return match.start()
+    return len(text)
+
+
+def _word_time(segment, word_index):
+    """Instante estimado de la palabra dentro del segmento (reparto uniforme), o None sin tiempos"""
+    if "start" not in segment:
+        return None
+    words = max(len(_WORD.findall(segment["text"])), 1)
+    return segment["start"] + (segment["end"] - segment["start"]) * min(word_index, words) / words
+
+
+def _truncate_after(segments, seg_index, word_index, seam_sec=None):
+    """Conserva el texto anterior a la palabra indicada; el segmento cortado termina en la costura"""
+    kept = segments[:seg_index]
+    segment = segments[seg_index]
+    text = segment["text"]
+    text = text[:_word_offset(text, word_index)].rstrip()
+    if text:
+        segment = dict(segment, text=text)
+        if seam_sec is not None:
+            segment["end"] = max(segment["start"], min(segment["end"], seam_sec))
+        kept.append(segment)
+    return kept
+
+
+def _truncate_before(segments, seg_index, word_index, seam_sec=None):
+    """Conserva el texto desde la palabra indicada; el segmento cortado empieza en la costura"""
+    segment = segments[seg_index]
+    text = segment["text"]
+    text = text[_word_offset(text, word_index):]
+    kept = []
+    if text:
+        segment = dict(segment, text=text)
+        if seam_sec is not None:
+            segment["start"] = min(segment["end"], max(segment["start"], seam_sec))
+        kept.append(segment)
+    return kept + segments[seg_index + 1:]
+
+
+def stitch_results(results, overlap_sec=0):
+    """
+    Combina los resultados normalizados de cada chunk (ya reubicados) en orden.
+
+    Con solapamiento, las palabras repetidas en cada costura se quitan por alineación:
+    se conserva el chunk anterior hasta la coincidencia y el siguiente desde ella.
+
+    Returns:
+        {"segments": [...]} si hay diarización, {"text": ...} si es texto plano
+    """
+    diarized = any("segments" in result for result in results)
+    pieces = [_as_segments(result) for result in results]
+
+    if overlap_sec:
+        for i in range(1, len(pieces)):
+            seam = _find_seam(pieces[i - 1], pieces[i], overlap_sec)
+            if seam is None:
+                continue
+            (prev_seg, prev_word), (next_seg, next_word) = seam
+            # Instante de la primera palabra repetida según cada chunk; los dos lados se cortan
+            # en su media para que no se solapen en el tiempo
+            seam_sec = None
+            times = [_word_time(pieces[i - 1][prev_seg], prev_word), _word_time(pieces[i][next_seg], next_word)]
+            if None not in times:
+                seam_sec = sum(times) / 2
+            pieces[i - 1] = _truncate_after(pieces[i - 1], prev_seg, prev_word, seam_sec)
+            pieces[i] = _truncate_before(pieces[i], next_seg, next_word, seam_sec)
+
+    if diarized:
+        return {"segments": [segment for piece in pieces for segment in piece]}
+    return {"text": "\n\n".join(piece[0]["text"] for piece in pieces if piece)}
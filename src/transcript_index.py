@@ -0,0 +1,262 @@
+"""
+Índice de las transcripciones de outputs/ con búsqueda de texto completo (SQLite FTS5)
+Cada transcripción se guarda como segmentos (archivo, variante, speaker, inicio, fin, texto)
+en cuanto se escribe; los archivos editados, copiados o borrados a mano se recogen con sync(),
+que solo vuelve a leer los que cambiaron de tamaño o mtime.
+Permite buscar "frase por speaker B entre el minuto 10 y el 20" sin leer ningún archivo
+"""
+
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from config import Config
+from post_processor import load_segments, parse_diarization
+
+# Variantes por sufijo del nombre (la más larga primero: _diarization_improved antes que _diarization)
+TRANSCRIPT_KINDS = ("diarization_improved", "diarization", "standard", "mini")
+DIARIZED_KINDS = ("diarization", "diarization_improved")
+
+# Palabras por pasaje al indexar texto sin segmentos (standard, mini)
+PASSAGE_WORDS = 80
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def transcript_kind(path):
+    """
+    Separa el nombre de una transcripción en nombre base y variante.
+
+    Returns:
+        (nombre base, variante) o None si no es una transcripción
+    """
+    path = Path(path)
+    if path.suffix != ".txt":
+        return None
+    for kind in TRANSCRIPT_KINDS:
+        suffix = f"_{kind}"
+        if path.stem.endswith(suffix) and len(path.stem) > len(suffix):
+            return path.stem[:-len(suffix)], kind
+    return None
+
+
+def text_passages(text, max_words=PASSAGE_WORDS):
+    """Divide texto sin timestamps en pasajes de frases completas (hasta max_words palabras)"""
+    passages = []
+    current = []
+    words = 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        current.append(sentence)
+        words += len(sentence.split())
+        if words >= max_words:
+            passages.append(" ".join(current))
+            current, words = [], 0
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def match_phrase(text):
+    """Consulta FTS5 de la frase exacta (sin interpretar la sintaxis de FTS)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+class TranscriptIndex:
+    def __init__(self, db_path=None, output_dir=None):
+        """
+        Args:
+            db_path: Base de datos del índice (por defecto CACHE_DIR/transcripts.db, una por directorio de salida)
+            output_dir: Directorio de transcripciones que recorre sync() (por defecto OUTPUT_DIR)
+        """
+        self.db_path = Path(db_path or Path(Config.CACHE_DIR) / "transcripts.db")
+        self.output_dir = Path(output_dir or Config.OUTPUT_DIR)
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    path TEXT PRIMARY KEY,
+                    base TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_transcripts_base ON transcripts(base, kind);
+
+                CREATE TABLE IF NOT EXISTS segments (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    speaker TEXT,
+                    start REAL,
+                    end REAL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_segments_path ON segments(path, start);
+                CREATE INDEX IF NOT EXISTS idx_segments_speaker ON segments(speaker, start);
+
+                -- Texto completo sin duplicar el contenido: lee el texto de segments
+                CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+                    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+                    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END;
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def index_file(self, transcript_path, segments=None):
+        """
+        Indexa (o vuelve a indexar) una transcripción.
+
+        Args:
+            transcript_path: Archivo *_standard.txt, *_mini.txt, *_diarization.txt o *_diarization_improved.txt
+            segments: Segmentos {"speaker", "start", "end", "text"} ya en memoria; si no, se leen del archivo
+
+        Returns:
+            Número de segmentos indexados, o None si el archivo no es una transcripción
+        """
+        path = Path(transcript_path).absolute()
+        naming = transcript_kind(path)
+        if naming is None:
+            return None
+        base, kind = naming
+        stat = os.stat(path)
+
+        if segments is None:
+            segments = self._read_segments(path, kind)
+        rows = [
+            (str(path), segment.get("speaker"), segment.get("start"), segment.get("end"), segment["text"])
+            for segment in segments if segment.get("text", "").strip()
+        ]
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM segments WHERE path = ?", (str(path),))
+            conn.executemany("INSERT INTO segments (path, speaker, start, end, text) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path), base, kind, stat.st_size, stat.st_mtime, time.time())
+            )
+        return len(rows)
+
+    def _read_segments(self, path, kind):
+        """Segmentos con speaker y timestamps si los hay; si no, pasajes de texto"""
+        if kind in DIARIZED_KINDS:
+            segments = load_segments(path) if kind == "diarization" else \
+                parse_diarization(path.read_text(encoding='utf-8'))
+            if segments:
+                return segments
+        return [{"text": passage} for passage in text_passages(path.read_text(encoding='utf-8'))]
+
+    def remove_file(self, transcript_path):
+        path = str(Path(transcript_path).absolute())
+        with self._connect() as conn:
+            conn.execute("DELETE FROM segments WHERE path = ?", (path,))
+            conn.execute("DELETE FROM transcripts WHERE path = ?", (path,))
+
+    def sync(self):
+        """
+        Pone el índice al día con output_dir: indexa las transcripciones nuevas o modificadas
+        y olvida las borradas.
+
+        Returns:
+            (indexadas, eliminadas)
+        """
+        current = {}
+        try:
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and transcript_kind(entry.name):
+                        stat = entry.stat()
+                        current[os.path.abspath(entry.path)] = (stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            pass
+
+        # Lo que ya no está en output_dir (borrado, o el directorio se movió) sale del índice
+        with self._connect() as conn:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in conn.execute("SELECT path, size, mtime FROM transcripts")
+            }
+
+        indexed = 0
+        for path, signature in current.items():
+            if known.get(path) != signature:
+                try:
+                    self.index_file(path)
+                    indexed += 1
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"   ⚠️  No se pudo indexar {Path(path).name}: {str(e)}")
+        missing = [path for path in known if path not in current]
+        for path in missing:
+            self.remove_file(path)
+        return indexed, len(missing)
+
+    def search(self, text=None, speaker=None, start_sec=None, end_sec=None, kind=None, base=None, limit=50):
+        """
+        Busca segmentos por frase, speaker, variante, archivo y rango de tiempo.
+        El rango incluye los segmentos que se solapan con él (los pasajes sin timestamps quedan fuera).
+
+        Args:
+            text: Frase exacta (sin distinguir mayúsculas ni tildes); None para filtrar solo por el resto
+
+        Returns:
+            Lista de {"base", "kind", "path", "speaker", "start", "end", "text"} en orden de archivo y tiempo;
+            con frase, "text" es un fragmento con la coincidencia entre «»
+        """
+        conditions = []
+        params = []
+        if text:
+            source = "segments_fts JOIN segments s ON s.id = segments_fts.rowid"
+            excerpt = "snippet(segments_fts, 0, '«', '»', '…', 24)"
+            conditions.append("segments_fts MATCH ?")
+            params.append(match_phrase(text))
+        else:
+            source = "segments s"
+            excerpt = "s.text"
+        if speaker:
+            conditions.append("s.speaker = ? COLLATE NOCASE")
+            params.append(speaker)
+        if start_sec is not None:
+            conditions.append("s.end >= ?")
+            params.append(start_sec)
+        if end_sec is not None:
+            conditions.append("s.start <= ?")
+            params.append(end_sec)
+        if kind:
+            conditions.append("t.kind = ?")
+            params.append(kind)
+        if base:
+            conditions.append("t.base = ?")
+            params.append(base)
+
+        query = (
+            f"SELECT t.base, t.kind, t.path, s.speaker, s.start, s.end, {excerpt} "
+            f"FROM {source} JOIN transcripts t ON t.path = s.path"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + " ORDER BY t.base, t.kind, s.start, s.id LIMIT ?"
+        )
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        keys = ("base", "kind", "path", "speaker", "start", "end", "text")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def improvable_bases(self):
+        """Nombres base con standard y diarization indexados y sin versión mejorada"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT base FROM transcripts GROUP BY base "
+                "HAVING SUM(kind = 'standard') > 0 AND SUM(kind = 'diarization') > 0 "
+                "AND SUM(kind = 'diarization_improved') = 0 ORDER BY base"
+            ).fetchall()
+        return [row[0] for row in rows]
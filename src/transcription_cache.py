@@ -0,0 +1,87 @@
+"""
+Caché persistente de transcripciones direccionada por contenido
+La clave es el hash del audio enviado + modelo + formato de respuesta
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import Config
+from scratch import as_audio_buffer
+
+
+class TranscriptionCache:
+    def __init__(self, db_path=None, max_size_mb=None):
+        self.db_path = Path(db_path or Path(Config.CACHE_DIR) / "transcriptions.db")
+        self.max_size_bytes = int((max_size_mb or Config.CACHE_MAX_SIZE_MB) * 1024 * 1024)
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcriptions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response_format TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON transcriptions(last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def hash_file(file_path, block_size=1024 * 1024):
+        """Hash SHA-256 del contenido del archivo (ruta o AudioBuffer en memoria)"""
+        digest = hashlib.sha256()
+        with as_audio_buffer(file_path).open() as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def make_key(self, audio_file_path, model, response_format):
+        """Clave de caché: hash del audio + modelo + formato de respuesta"""
+        return f"{self.hash_file(audio_file_path)}:{model}:{response_format}"
+
+    def get(self, key):
+        """Devuelve el resultado guardado (dict) o None si no está en caché"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT payload FROM transcriptions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE transcriptions SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Guarda un resultado y aplica la expulsión por tamaño (LRU)"""
+        model, response_format = key.split(":")[1:3]
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcriptions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response_format, payload, len(payload.encode("utf-8")), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Elimina las entradas menos usadas hasta quedar bajo el tamaño máximo"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcriptions").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        rows = conn.execute("SELECT key, size FROM transcriptions ORDER BY last_access").fetchall()
+        expired = []
+        for key, size in rows:
+            if total <= self.max_size_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM transcriptions WHERE key = ?", expired)
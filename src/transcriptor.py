@@ -4,22 +4,42 @@ Transcriptor de Audio usando OpenAI Whisper
 Procesa archivos M4A y genera transcripciones en texto
 """
 
+import argparse
 import sys
+import threading
+import time
 from pathlib import Path
-from audio_processor import AudioProcessor
+from audio_processor import AudioProcessor, plan_signature
+from media_index import MediaIndex
 from openai_service import OpenAITranscriptionService
+from pipeline import TranscriptionPipeline
+from transcript_index import TRANSCRIPT_KINDS, TranscriptIndex
+from watcher import WatchService
+from work_queue import WorkQueue
 from config import Config
 
 
-def improve_diarization(base_name: str = None):
-    """Mejora la diarización combinando standard + diarization con GPT-4o"""
+def improve_all(improver, improvable):
+    """Mejora todos los archivos en paralelo"""
+    print(f"\n🔄 Procesando {len(improvable)} archivo(s) "
+          f"({Config.IMPROVE_FILE_CONCURRENCY} en paralelo)...")
+    results = improver.process_many(improvable)
+    failed = [name for name, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        print(f"⚠️  {len(failed)} archivo(s) con errores: {', '.join(failed)}")
+
+
+def improve_diarization(base_name: str = None, use_llm: bool = False, process_all: bool = False,
+                        transcript_index=None):
+    """Mejora la diarización combinando standard + diarization (alineador local o GPT-4o)"""
     from post_processor import DiarizationImprover
 
     print("🔧 Mejora de Diarización")
     print("=" * 50)
+    print(f"   Modo: {'GPT-4o' if use_llm else 'alineación local (sin API)'}")
 
     try:
-        improver = DiarizationImprover()
+        improver = DiarizationImprover(use_llm=use_llm, transcript_index=transcript_index)
 
         if base_name:
             # Procesar archivo específico
@@ -35,6 +55,11 @@ def improve_diarization(base_name: str = None):
                 print("   Se necesitan ambos: *_standard.txt y *_diarization.txt")
                 return
 
+            if process_all:
+                improve_all(improver, improvable)
+                print("\n🎉 Proceso completado!")
+                return
+
             print(f"📋 Archivos disponibles para mejorar:")
             for i, name in enumerate(improvable, 1):
                 print(f"   {i}. {name}")
@@ -44,10 +69,7 @@ def improve_diarization(base_name: str = None):
                 choice = input("\nSelecciona archivo (número) o 'all' para todos: ").strip()
 
                 if choice.lower() == 'all':
-                    for name in improvable:
-                        print(f"\n🔄 Procesando: {name}")
-                        output_path = improver.process_files(name)
-                        print(f"   ✅ Guardado: {Path(output_path).name}")
+                    improve_all(improver, improvable)
                     break
                 elif choice.isdigit() and 1 <= int(choice) <= len(improvable):
                     name = improvable[int(choice) - 1]
@@ -71,108 +93,283 @@ def improve_diarization(base_name: str = None):
         sys.exit(1)
 
 
+def show_split_plan(audio_processor):
+    """Muestra el plan de división de cada archivo sin transcribir (--dry-run)"""
+    print("📐 Plan de división (dry-run)")
+    print("=" * 50)
+
+    audio_files = audio_processor.get_audio_files()
+
+    if not audio_files:
+        print(f"❌ No se encontraron archivos de audio en '{audio_processor.input_dir}'")
+        return
+
+    media_index = audio_processor.media_index
+    total_chunks = 0
+    for audio_file in audio_files:
+        try:
+            plan = audio_processor.plan_split(audio_file, probe=audio_processor.probe_source(audio_file))
+            total_chunks += plan["num_chunks"]
+            print(f"   • {audio_file.name}: {audio_processor.describe_plan(plan)}")
+            # Cortes reales (ya buscados en silencio) si el archivo se dividió antes con estos ajustes;
+            # con VAD están en la línea de tiempo recortada y no se comparan con el plan nominal
+            cached = media_index.get_plan(audio_file, plan_signature()) if media_index else None
+            windows = cached if cached and not Config.VAD_ENABLED else plan["windows"]
+            if len(windows) > 1:
+                if windows is cached:
+                    print("      (cortes definitivos de la última división)")
+                for i, (start_ms, end_ms) in enumerate(windows, 1):
+                    print(f"      {i}. {start_ms / 60000:.1f}-{end_ms / 60000:.1f} min")
+        except Exception as e:
+            print(f"   ❌ {audio_file.name}: {str(e)}")
+
+    print(f"\n📊 Total: {total_chunks} chunk(s) en {len(audio_files)} archivo(s)")
+
+
+def format_clock(seconds):
+    """Segundos como mm:ss (o h:mm:ss)"""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def search_transcripts(transcript_index, args):
+    """Busca en las transcripciones indexadas (--search) e imprime las coincidencias"""
+    started = time.perf_counter()
+    indexed, removed = transcript_index.sync()
+    if indexed or removed:
+        print(f"🗂️  Índice actualizado: {indexed} transcripción(es) indexada(s), {removed} eliminada(s)")
+
+    started_query = time.perf_counter()
+    matches = transcript_index.search(
+        args.search or None, speaker=args.speaker, kind=args.kind, base=args.file, limit=args.limit,
+        start_sec=args.from_min * 60 if args.from_min is not None else None,
+        end_sec=args.to_min * 60 if args.to_min is not None else None,
+    )
+    query_ms = (time.perf_counter() - started_query) * 1000
+
+    if not matches:
+        print("❌ Sin resultados")
+    current = None
+    for match in matches:
+        if (match["base"], match["kind"]) != current:
+            current = (match["base"], match["kind"])
+            print(f"\n📄 {match['base']} ({match['kind']})")
+        when = f"{format_clock(match['start'])}-{format_clock(match['end'])} " if match["start"] is not None else ""
+        speaker = f"[{match['speaker']}] " if match["speaker"] else ""
+        print(f"   {when}{speaker}{match['text']}")
+    print(f"\n🔎 {len(matches)} resultado(s) en {query_ms:.1f} ms "
+          f"(total con sincronización: {(time.perf_counter() - started) * 1000:.0f} ms)")
+
+
+def write_run_report(pipeline, metrics_file=None):
+    """Informe JSON/CSV de la ejecución y, si se pidió, métricas Prometheus"""
+    pipeline.metrics.finish()
+    report_path = pipeline.metrics.write_report()
+    if metrics_file:
+        pipeline.metrics.write_prometheus(metrics_file)
+    return report_path
+
+
+def run_watch(pipeline, args):
+    """
+    Modo servicio (--watch) o worker (--worker): transcribe los archivos de la cola
+    hasta recibir SIGTERM o Ctrl+C. Solo --watch vigila el directorio y encola.
+    """
+    metrics_lock = threading.Lock()
+
+    def file_done(audio_file, error):
+        # Métricas actualizadas tras cada archivo para que Prometheus las vea sin esperar al cierre
+        if args.metrics_file:
+            with metrics_lock:
+                pipeline.metrics.write_prometheus(args.metrics_file)
+
+    service = WatchService(pipeline, args.input_dir, work_queue=WorkQueue(args.queue), poll_sec=args.poll,
+                           on_file_done=file_done, scan=args.watch)
+    service.install_signal_handlers()
+    try:
+        stats = service.run()
+    finally:
+        report_path = write_run_report(pipeline, args.metrics_file)
+    print(f"\n📊 Completados: {stats['completed']} | Omitidos: {stats['skipped']} | Errores: {stats['failed']}")
+    print(f"📈 Informe: {report_path}")
+
+
+def resolve_model(value):
+    """Acepta la clave del menú ("1"-"3") o el nombre del modelo"""
+    if value in Config.AVAILABLE_MODELS:
+        model_info = Config.AVAILABLE_MODELS[value]
+        return model_info["name"], model_info["display_name"]
+    for model_info in Config.AVAILABLE_MODELS.values():
+        if value == model_info["name"]:
+            return model_info["name"], model_info["display_name"]
+    raise argparse.ArgumentTypeError(
+        f"modelo desconocido: {value} (opciones: {', '.join(Config.AVAILABLE_MODELS)} o nombre del modelo)"
+    )
+
+
+def select_model_interactively():
+    """Selección de modelo por consola (solo si no se indicó ninguno)"""
+    print("Modelos disponibles:")
+    for key, model_info in Config.AVAILABLE_MODELS.items():
+        print(f"   {key}. {model_info['display_name']}")
+
+    while True:
+        choice = input("\nSelecciona modelo (1-3): ").strip()
+        if choice in Config.AVAILABLE_MODELS:
+            return resolve_model(choice)
+        print("❌ Opción inválida. Selecciona 1, 2 o 3.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Transcriptor de audio con OpenAI",
+        epilog="Ejemplo: transcriptor.py -m 1 3 -c 6 && transcriptor.py --improve --all",
+    )
+    parser.add_argument("model_keys", nargs="*", type=resolve_model, metavar="MODELO",
+                        help="Modelo(s) por clave (1-3) o nombre; equivalente a --models")
+    parser.add_argument("-m", "--models", nargs="+", type=resolve_model, default=[],
+                        help="Modelos a ejecutar sobre la misma división del audio")
+    parser.add_argument("-i", "--input-dir", default=Config.INPUT_DIR,
+                        help="Directorio con los audios (por defecto: mp3/)")
+    parser.add_argument("-o", "--output-dir", default=Config.OUTPUT_DIR,
+                        help="Directorio de transcripciones (por defecto: outputs/)")
+    parser.add_argument("-c", "--concurrency", type=int,
+                        help=f"Peticiones simultáneas a la API (por defecto: {Config.MAX_CONCURRENT_REQUESTS})")
+    parser.add_argument("--decode-workers", type=int,
+                        help=f"Procesos de decodificación (por defecto: {Config.PIPELINE_DECODE_WORKERS})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostrar el plan de división sin llamar a la API")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continuar trabajos interrumpidos desde el primer chunk sin terminar")
+    parser.add_argument("--vad", action=argparse.BooleanOptionalAction, default=Config.VAD_ENABLED,
+                        help="Recortar las pausas largas antes de subir (timestamps en la línea de tiempo "
+                             "original); --no-vad lo desactiva aunque VAD_TRIM=1")
+    parser.add_argument("--watch", action="store_true",
+                        help="Modo servicio: vigilar el directorio de entrada y transcribir los archivos según llegan")
+    parser.add_argument("--worker", action="store_true",
+                        help="Modo worker: procesar la cola compartida sin vigilar el directorio "
+                             "(varios procesos o hosts con la misma --queue y -o)")
+    parser.add_argument("--queue", default=Config.WORK_QUEUE_DB or None, metavar="RUTA",
+                        help="Con --watch/--worker: base de datos de la cola (por defecto: outputs/.watch/queue.db)")
+    parser.add_argument("--poll", type=float, metavar="SEG",
+                        help=f"Con --watch/--worker: intervalo de sondeo (por defecto: {Config.WATCH_POLL_SEC:g}s)")
+    parser.add_argument("--metrics-file", default=Config.METRICS_PROMETHEUS_FILE or None, metavar="RUTA",
+                        help="Escribir métricas Prometheus (textfile collector) al terminar")
+    parser.add_argument("--search", nargs="?", const="", metavar="FRASE",
+                        help="Buscar una frase en las transcripciones de -o (sin frase: filtrar solo por "
+                             "--speaker/--from/--to)")
+    parser.add_argument("--speaker", help="Con --search: solo este speaker (p. ej. B)")
+    parser.add_argument("--from", dest="from_min", type=float, metavar="MIN",
+                        help="Con --search: desde este minuto")
+    parser.add_argument("--to", dest="to_min", type=float, metavar="MIN",
+                        help="Con --search: hasta este minuto")
+    parser.add_argument("--kind", choices=TRANSCRIPT_KINDS,
+                        help="Con --search: solo esta variante de transcripción")
+    parser.add_argument("--file", metavar="NOMBRE",
+                        help="Con --search: solo este archivo (nombre base, sin sufijo)")
+    parser.add_argument("--limit", type=int, default=50,
+                        help="Con --search: número máximo de resultados (por defecto: 50)")
+    parser.add_argument("--improve", nargs="?", const="", metavar="NOMBRE",
+                        help="Mejorar diarización (un archivo, o todos con --all)")
+    parser.add_argument("--all", action="store_true",
+                        help="Con --improve: procesar todos los archivos sin preguntar")
+    parser.add_argument("--llm", action="store_true",
+                        help="Con --improve: usar GPT-4o en lugar del alineador local")
+    return parser
+
+
 def main():
     """Función principal del transcriptor"""
+    args = build_parser().parse_args()
+
+    if args.output_dir != Config.OUTPUT_DIR:
+        Config.set_output_dir(args.output_dir)
+    if args.concurrency:
+        Config.MAX_CONCURRENT_REQUESTS = args.concurrency
+    Config.VAD_ENABLED = args.vad
 
-    # Manejar argumento --improve para mejorar diarización
-    if len(sys.argv) > 1 and sys.argv[1] == "--improve":
-        base_name = sys.argv[2] if len(sys.argv) > 2 else None
-        improve_diarization(base_name)
+    transcript_index = TranscriptIndex() if Config.TRANSCRIPT_INDEX_ENABLED else None
+
+    # Buscar en las transcripciones
+    if args.search is not None:
+        if transcript_index is None:
+            print("❌ El índice de transcripciones está desactivado (TRANSCRIPT_INDEX=0)")
+            sys.exit(2)
+        search_transcripts(transcript_index, args)
+        return
+
+    # Mejorar diarización
+    if args.improve is not None:
+        improve_diarization(args.improve or None, use_llm=args.llm, process_all=args.all,
+                            transcript_index=transcript_index)
+        return
+
+    media_index = None
+    if Config.MEDIA_INDEX_ENABLED:
+        media_index = MediaIndex()
+        # Los archivos borrados o movidos fuera salen del índice
+        media_index.prune()
+    audio_processor = AudioProcessor(args.input_dir, args.output_dir, media_index=media_index)
+
+    # Mostrar el plan de división sin llamar a la API
+    if args.dry_run:
+        show_split_plan(audio_processor)
         return
 
     print("🎤 Transcriptor de Audio - OpenAI")
     print("=" * 50)
 
-    # Verificar si se pasó modelo por argumento
-    if len(sys.argv) > 1 and sys.argv[1] in Config.AVAILABLE_MODELS:
-        choice = sys.argv[1]
-        selected_model = Config.AVAILABLE_MODELS[choice]["name"]
-        model_display = Config.AVAILABLE_MODELS[choice]["display_name"]
+    if args.resume:
+        print("🔁 Modo reanudación: se continuará desde el primer chunk sin terminar")
+
+    # Modelos: argumentos (sin duplicados) o selección interactiva
+    models = list(dict.fromkeys(args.model_keys + args.models))
+    if not models:
+        if not sys.stdin.isatty():
+            print("❌ Indica al menos un modelo (-m 1 3) al ejecutar sin terminal")
+            sys.exit(2)
+        models = [select_model_interactively()]
+    for _, model_display in models:
         print(f"✅ Usando modelo: {model_display}")
-    else:
-        # Seleccionar modelo interactivamente
-        print("Modelos disponibles:")
-        for key, model_info in Config.AVAILABLE_MODELS.items():
-            print(f"   {key}. {model_info['display_name']}")
-
-        while True:
-            choice = input("\nSelecciona modelo (1-3): ").strip()
-            if choice in Config.AVAILABLE_MODELS:
-                selected_model = Config.AVAILABLE_MODELS[choice]["name"]
-                model_display = Config.AVAILABLE_MODELS[choice]["display_name"]
-                break
-            print("❌ Opción inválida. Selecciona 1, 2 o 3.")
-        print(f"✅ Usando: {model_display}")
     
     try:
         # Inicializar componentes
-        audio_processor = AudioProcessor()
         transcription_service = OpenAITranscriptionService()
+        pipeline = TranscriptionPipeline(
+            audio_processor, transcription_service, models,
+            decode_workers=args.decode_workers, resume=args.resume or args.watch or args.worker,
+            transcript_index=transcript_index
+        )
+        
+        if args.watch or args.worker:
+            # En modo servicio siempre se reanuda: un reinicio (o el worker que recoge el archivo
+            # de otro caído) no repite chunks ya transcritos
+            run_watch(pipeline, args)
+            return
         
         # Buscar archivos de audio
         audio_files = audio_processor.get_audio_files()
         
         if not audio_files:
-            print("❌ No se encontraron archivos de audio en el directorio 'mp3'")
+            print(f"❌ No se encontraron archivos de audio en '{audio_processor.input_dir}'")
             return
         
+        # El más largo primero: los cortos rellenan los huecos al final
+        audio_files = audio_processor.order_longest_first(audio_files)
         print(f"📁 Encontrados {len(audio_files)} archivo(s) de audio:")
         for file in audio_files:
             print(f"   • {file.name}")
         
-        # Procesar cada archivo
-        for i, audio_file in enumerate(audio_files, 1):
-            print(f"\n🔄 Procesando ({i}/{len(audio_files)}): {audio_file.name}")
-            
-            try:
-                # Preparar archivo para transcripción
-                prepared_file, info = audio_processor.prepare_for_transcription(audio_file)
-                print(f"   📄 Archivo: {info}")
-                
-                # Verificar si ya existe transcripción (con sufijo del modelo)
-                if "mini" in selected_model:
-                    model_suffix = "_mini"
-                elif "diarize" in selected_model:
-                    model_suffix = "_diarization"
-                else:
-                    model_suffix = "_standard"
-                output_path = audio_processor.get_output_path(audio_file).with_name(
-                    audio_processor.get_output_path(audio_file).stem + model_suffix + ".txt"
-                )
-                if output_path.exists():
-                    print(f"   ⚠️  Ya existe transcripción: {output_path.name}")
-                    continue
-                
-                # Dividir archivo si es necesario
-                chunk_paths = audio_processor.split_large_audio(prepared_file)
-                
-                if len(chunk_paths) == 1:
-                    # Archivo pequeño, transcripción directa
-                    print(f"   🤖 Enviando a {model_display}...")
-                    transcription = transcription_service.transcribe_audio(chunk_paths[0], model=selected_model)
-                else:
-                    # Archivo grande, transcribir por chunks
-                    print(f"   🤖 Transcribiendo {len(chunk_paths)} chunks con {model_display}...")
-                    transcriptions = []
-                    
-                    for i, chunk_path in enumerate(chunk_paths, 1):
-                        print(f"      🔄 Chunk {i}/{len(chunk_paths)}")
-                        chunk_transcription = transcription_service.transcribe_audio(chunk_path, model=selected_model)
-                        transcriptions.append(chunk_transcription)
-                    
-                    # Combinar transcripciones
-                    transcription = "\n\n".join(transcriptions)
-                    
-                    # Limpiar archivos temporales
-                    audio_processor.cleanup_temp_files(chunk_paths)
-                
-                # Guardar resultado
-                transcription_service.save_transcription(transcription, output_path)
-                print(f"   ✅ Transcripción guardada: {output_path.name}")
-                
-            except Exception as e:
-                print(f"   ❌ Error procesando {audio_file.name}: {str(e)}")
-                continue
+        # Procesar archivos: una división por archivo, decodificación y subida solapadas
+        try:
+            stats = pipeline.run(audio_files)
+        finally:
+            # El informe se escribe también si la ejecución se interrumpe
+            report_path = write_run_report(pipeline, args.metrics_file)
+        print(f"\n📊 Completados: {stats['completed']} | Omitidos: {stats['skipped']} | Errores: {stats['failed']}")
+        print(pipeline.metrics.summary())
+        print(f"📈 Informe: {report_path}")
         
         print(f"\n🎉 Proceso completado!")
         
@@ -184,4 +381,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,175 @@
+"""
+Modo servicio: vigila el directorio de entrada y transcribe los archivos según llegan
+Sondea con os.scandir y solo encola un archivo cuando su tamaño y mtime dejan de cambiar
+(copias en curso, subidas por rsync/scp). La cola es persistente y el pipeline procesa
+varios archivos a la vez; cada transcripción se guarda en cuanto termina.
+En modo worker no se vigila nada: solo se procesan archivos de una cola compartida
+"""
+
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from audio_processor import SUPPORTED_EXTENSIONS
+from config import Config
+from work_queue import WorkQueue
+
+
+class DirectoryWatcher:
+    """Detecta archivos de audio estables (sin cambios durante varios sondeos)"""
+
+    def __init__(self, input_dir, settle_sec=None, stable_checks=None):
+        # Ruta absoluta: la cola persistente no depende del directorio de trabajo
+        self.input_dir = Path(input_dir).absolute()
+        self.settle_sec = Config.WATCH_SETTLE_SEC if settle_sec is None else settle_sec
+        self.stable_checks = stable_checks or Config.WATCH_STABLE_CHECKS
+        # ruta -> (tamaño, mtime, sondeos seguidos sin cambios)
+        self._observed = {}
+
+    def scan(self):
+        """
+        Un sondeo del directorio.
+
+        Returns:
+            Lista de (ruta, tamaño, mtime) de los archivos que ya se pueden procesar
+        """
+        now = time.time()
+        current = {}
+        try:
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                        continue
+                    stat = entry.stat()
+                    current[entry.path] = (stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            return []
+
+        ready = []
+        observed = {}
+        for path, (size, mtime) in current.items():
+            previous = self._observed.get(path)
+            checks = previous[2] + 1 if previous and previous[:2] == (size, mtime) else 1
+            observed[path] = (size, mtime, checks)
+            if checks >= self.stable_checks and now - mtime >= self.settle_sec and size > 0:
+                ready.append((Path(path), size, mtime))
+        # Los archivos borrados dejan de vigilarse
+        self._observed = observed
+        return ready
+
+
+class WatchService:
+    """Bucle del modo servicio: sondeo -> cola persistente -> pipeline"""
+
+    def __init__(self, pipeline, input_dir, work_queue=None, watcher=None, poll_sec=None, on_file_done=None,
+                 scan=True):
+        """
+        Args:
+            pipeline: TranscriptionPipeline (se arranca y se cierra aquí)
+            on_file_done: Callback opcional on_file_done(audio_file, error) tras cada archivo
+            scan: False para un worker que solo consume la cola (otro proceso encola)
+        """
+        self.pipeline = pipeline
+        self.work_queue = work_queue or WorkQueue()
+        self.watcher = (watcher or DirectoryWatcher(input_dir)) if scan else None
+        self.poll_sec = poll_sec or Config.WATCH_POLL_SEC
+        self.on_file_done = on_file_done
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        # Firmas ya enviadas a la cola: evita consultar SQLite en cada sondeo
+        self._known = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def stop(self, *_):
+        """Deja de aceptar archivos; los que están en curso terminan antes de salir"""
+        if not self._stop.is_set():
+            print("\n🛑 Deteniendo: se terminan los archivos en curso (Ctrl+C otra vez para salir ya)")
+            self._stop.set()
+            self._wake.set()
+        else:
+            raise KeyboardInterrupt
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self):
+        recovered = self.work_queue.recover()
+        if recovered:
+            print(f"🔁 {recovered} archivo(s) interrumpido(s) vuelven a la cola")
+        if self.watcher is not None:
+            print(f"👀 Vigilando {self.watcher.input_dir} (cada {self.poll_sec:g}s, "
+                  f"{self.pipeline.capacity} archivo(s) en curso como máximo)")
+        else:
+            print(f"👷 Worker {self.work_queue.worker_id} sobre {self.work_queue.db_path} "
+                  f"({self.pipeline.capacity} archivo(s) en curso como máximo)")
+
+        # Los leases se renuevan aparte: close() espera a los archivos en curso sin bloquearlos
+        leases_done = threading.Event()
+        renewer = threading.Thread(target=self._renew_leases, args=(leases_done,), daemon=True)
+        renewer.start()
+        self.pipeline.start()
+        try:
+            while not self._stop.is_set():
+                if self.watcher is not None:
+                    self._enqueue_ready()
+                self._dispatch()
+                # Un archivo terminado despierta el bucle para despachar el siguiente sin esperar
+                self._wake.wait(self.poll_sec)
+                self._wake.clear()
+        finally:
+            stats = self.pipeline.close()
+            leases_done.set()
+            renewer.join()
+        return stats
+
+    def _renew_leases(self, done):
+        """Renueva el lease de los archivos en curso cada tercio de su duración"""
+        while not done.wait(self.work_queue.lease_sec / 3):
+            with self._in_flight_lock:
+                entries = list(self._in_flight.values())
+            try:
+                self.work_queue.renew(entries)
+            except Exception as e:
+                # Un fallo puntual (volumen compartido ocupado) se reintenta en la siguiente vuelta
+                print(f"   ⚠️  No se pudo renovar el lease: {str(e)}")
+
+    def _enqueue_ready(self):
+        for path, size, mtime in self.watcher.scan():
+            if self._known.get(path) == (size, mtime):
+                continue
+            self._known[path] = (size, mtime)
+            change = self.work_queue.enqueue(path, size, mtime)
+            if change == "new":
+                print(f"📥 Nuevo archivo: {path.name}")
+            elif change == "changed":
+                print(f"📥 Archivo modificado, se transcribe de nuevo: {path.name}")
+
+    def _dispatch(self):
+        with self._in_flight_lock:
+            free = self.pipeline.capacity - len(self._in_flight)
+        if free <= 0:
+            return
+        for entry in self.work_queue.claim(limit=free):
+            audio_file = Path(entry["path"])
+            with self._in_flight_lock:
+                self._in_flight[audio_file] = entry
+            try:
+                self.pipeline.submit(audio_file, force=entry["changed"], on_done=self._file_done)
+            except Exception as e:
+                print(f"   ❌ Error encolando {audio_file.name}: {str(e)}")
+                self._file_done(audio_file, e)
+
+    def _file_done(self, audio_file, error):
+        """Llamado desde los hilos del pipeline al terminar un archivo"""
+        with self._in_flight_lock:
+            entry = self._in_flight.pop(audio_file, None)
+        if entry is not None:
+            self.work_queue.finish(entry, error)
+        if self.on_file_done:
+            self.on_file_done(audio_file, error)
+        self._wake.set()
@@ -0,0 +1,206 @@
+"""
+Cola de trabajo persistente (SQLite) para el modo servicio y los workers
+Cada archivo se identifica por su ruta y su firma (tamaño + mtime): solo se encola
+de nuevo si aparece o cambia, y sobrevive a reinicios del proceso.
+Varios procesos o hosts pueden compartir la cola (archivo en un volumen compartido):
+cada archivo en curso tiene un lease que su worker renueva; si el worker muere,
+el lease vence y otro worker lo retoma (los chunks ya hechos se reanudan del diario)
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+from config import Config
+from scratch import pid_alive
+
+
+def default_worker_id():
+    """Identificador del worker: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    STATUS_PENDING = "pending"
+    STATUS_PROCESSING = "processing"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, db_path=None, worker_id=None, lease_sec=None):
+        """
+        Args:
+            db_path: Base de datos de la cola (WORK_QUEUE_DB o outputs/.watch/queue.db)
+            worker_id: Identificador de este worker (por defecto host:pid)
+            lease_sec: Segundos que un archivo reclamado sigue asignado sin renovar el lease
+        """
+        self.db_path = Path(db_path or Config.WORK_QUEUE_DB or Path(Config.WATCH_DIR) / "queue.db")
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_sec = lease_sec or Config.WORKER_LEASE_SEC
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    changed INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    error TEXT,
+                    worker TEXT,
+                    lease_expires REAL
+                )
+            """)
+            # Colas creadas antes de los leases
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            for column, column_type in (("worker", "TEXT"), ("lease_expires", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON files(status, enqueued_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción con el bloqueo de escritura desde el principio: dos workers no reclaman lo mismo"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+    def enqueue(self, path, size, mtime):
+        """
+        Encola el archivo si es nuevo o si su firma cambió.
+
+        Returns:
+            "new", "changed" o None si ya estaba encolado/procesado con la misma firma
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT size, mtime FROM files WHERE path = ?", (str(path),)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO files (path, size, mtime, status, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                    (str(path), size, mtime, self.STATUS_PENDING, now)
+                )
+                return "new"
+            if row == (size, mtime):
+                return None
+            # El audio cambió: se vuelve a transcribir aunque existan las salidas anteriores
+            conn.execute(
+                "UPDATE files SET size = ?, mtime = ?, status = ?, changed = 1, attempts = 0, enqueued_at = ?, "
+                "started_at = NULL, finished_at = NULL, error = NULL, worker = NULL, lease_expires = NULL "
+                "WHERE path = ?",
+                (size, mtime, self.STATUS_PENDING, now, str(path))
+            )
+            return "changed"
+
+    def claim(self, limit=1):
+        """
+        Toma los archivos pendientes más antiguos y los asigna a este worker con un lease.
+        Los fallidos se reintentan pasado WATCH_RETRY_DELAY_SEC, hasta WATCH_MAX_ATTEMPTS intentos.
+        Los leases vencidos (worker caído) vuelven antes a pendientes, con el mismo límite de intentos.
+
+        Returns:
+            Lista de {"path", "size", "mtime", "changed"}
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            rows = conn.execute(
+                "SELECT path, size, mtime, changed FROM files "
+                "WHERE status = ? OR (status = ? AND attempts < ? AND finished_at <= ?) "
+                "ORDER BY enqueued_at LIMIT ?",
+                (self.STATUS_PENDING, self.STATUS_FAILED, Config.WATCH_MAX_ATTEMPTS,
+                 now - Config.WATCH_RETRY_DELAY_SEC, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE files SET status = ?, attempts = attempts + 1, started_at = ?, worker = ?, "
+                "lease_expires = ? WHERE path = ?",
+                [(self.STATUS_PROCESSING, now, self.worker_id, now + self.lease_sec, row[0]) for row in rows]
+            )
+        return [{"path": row[0], "size": row[1], "mtime": row[2], "changed": bool(row[3])} for row in rows]
+
+    def _expire_leases(self, conn, now):
+        """Archivos de workers que dejaron de renovar: otro intento o fallo si se agotaron"""
+        conn.execute(
+            "UPDATE files SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "error = CASE WHEN attempts < ? THEN error ELSE 'lease vencido (worker ' || worker || ')' END, "
+            "finished_at = ?, worker = NULL, lease_expires = NULL "
+            "WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+            (Config.WATCH_MAX_ATTEMPTS, self.STATUS_PENDING, self.STATUS_FAILED,
+             Config.WATCH_MAX_ATTEMPTS, now, self.STATUS_PROCESSING, now)
+        )
+
+    def renew(self, entries):
+        """Extiende el lease de los archivos que este worker sigue procesando"""
+        if not entries:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE files SET lease_expires = ? WHERE path = ? AND worker = ? AND status = ?",
+                [(time.time() + self.lease_sec, entry["path"], self.worker_id, self.STATUS_PROCESSING)
+                 for entry in entries]
+            )
+
+    def finish(self, entry, error=None):
+        """
+        Marca el resultado de un archivo reclamado.
+        Si el archivo cambió mientras se procesaba, la fila ya está pendiente otra vez y no se toca;
+        tampoco si el lease venció y el archivo pasó a otro worker.
+        Un fallo conserva la marca de cambio para que el reintento no omita el archivo.
+        """
+        status = self.STATUS_FAILED if error else self.STATUS_DONE
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE files SET status = ?, changed = changed * ?, finished_at = ?, error = ?, "
+                "worker = NULL, lease_expires = NULL "
+                "WHERE path = ? AND size = ? AND mtime = ? AND status = ? AND worker = ?",
+                (status, 1 if error else 0, time.time(), str(error) if error else None,
+                 entry["path"], entry["size"], entry["mtime"], self.STATUS_PROCESSING, self.worker_id)
+            )
+
+    def recover(self):
+        """
+        Devuelve a pendientes los archivos que quedaron en proceso tras un corte en este host
+        (su proceso ya no existe), sin esperar a que venza el lease.
+        Los de otros hosts se recuperan al vencer su lease.
+
+        Returns:
+            Número de archivos recuperados
+        """
+        host = socket.gethostname()
+        with self._transaction() as conn:
+            stale = []
+            for path, worker in conn.execute(
+                "SELECT path, worker FROM files WHERE status = ?", (self.STATUS_PROCESSING,)
+            ).fetchall():
+                worker_host, _, pid = (worker or "").rpartition(":")
+                if not worker or (worker_host == host and pid.isdigit() and int(pid) != os.getpid()
+                                  and not pid_alive(int(pid))):
+                    stale.append((self.STATUS_PENDING, path))
+            conn.executemany(
+                "UPDATE files SET status = ?, worker = NULL, lease_expires = NULL WHERE path = ?", stale
+            )
+        return len(stale)
+
+    def counts(self):
+        """Número de archivos por estado"""
+        with self._lock, closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
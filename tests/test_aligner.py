@@ -0,0 +1,57 @@
+"""Alineador local standard ↔ diarización (sin API, determinista)"""
+
+from aligner import align_transcripts
+
+
+def segment(speaker, start, end, text):
+    return {"speaker": speaker, "start": start, "end": end, "text": text}
+
+
+def test_identical_texts_keep_segments():
+    segments = [
+        segment("A", 0.0, 3.0, "buenos días a todos"),
+        segment("B", 3.0, 6.0, "gracias por venir"),
+    ]
+    turns = align_transcripts("buenos días a todos gracias por venir", segments)
+    assert turns == segments
+
+
+def test_speaker_change_at_boundary():
+    segments = [
+        segment("A", 0.0, 2.0, "empezamos la entrevista"),
+        segment("B", 2.0, 5.0, "perfecto cuando quieras"),
+        segment("A", 5.0, 8.0, "primera pregunta"),
+    ]
+    turns = align_transcripts("Empezamos la entrevista. Perfecto, cuando quieras. Primera pregunta.", segments)
+    assert [turn["speaker"] for turn in turns] == ["A", "B", "A"]
+    assert [turn["text"] for turn in turns] == [
+        "Empezamos la entrevista.", "Perfecto, cuando quieras.", "Primera pregunta."
+    ]
+    assert [(turn["start"], turn["end"]) for turn in turns] == [(0.0, 2.0), (2.0, 5.0), (5.0, 8.0)]
+
+
+def test_unmatched_words_stay_with_previous_speaker():
+    segments = [
+        segment("A", 0.0, 2.0, "hola qué tal"),
+        segment("B", 2.0, 4.0, "muy bien gracias"),
+    ]
+    turns = align_transcripts("hola qué tal eh bueno muy bien gracias", segments)
+    assert [(turn["speaker"], turn["text"]) for turn in turns] == [
+        ("A", "hola qué tal eh bueno"), ("B", "muy bien gracias")
+    ]
+
+
+def test_accents_and_punctuation_do_not_break_alignment():
+    segments = [
+        segment("A", 0.0, 2.0, "y entonces que paso"),
+        segment("B", 2.0, 4.0, "cuentame tu primero"),
+    ]
+    turns = align_transcripts("Y entonces, ¿qué pasó? Cuéntame tú primero.", segments)
+    assert [(turn["speaker"], turn["text"]) for turn in turns] == [
+        ("A", "Y entonces, ¿qué pasó?"), ("B", "Cuéntame tú primero.")
+    ]
+
+
+def test_empty_input():
+    assert align_transcripts("", [segment("A", 0.0, 1.0, "hola")]) == []
+    assert align_transcripts("hola", []) == []
@@ -0,0 +1,107 @@
+"""
+Los chunks exportados duran lo que dice su ventana, también los que van por pipe:
+una cabecera con la duración del archivo de origen (STREAMINFO de flac) haría que
+la API recibiera un chunk con duración y número de muestras falsos
+"""
+
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from audio_processor import AudioProcessor
+from config import Config
+
+pytestmark = pytest.mark.skipif(not shutil.which("ffmpeg") or not shutil.which("ffprobe"),
+                                reason="necesita ffmpeg y ffprobe")
+
+SOURCE_SEC = 90
+WINDOWS = [(0, 40000), (40000, 75000), (75000, 90000)]
+
+# Archivo de origen -> argumentos de códec (VBR en mp3: sin Xing la duración estimada es falsa)
+SOURCES = {
+    "source.flac": ["-c:a", "flac"],
+    "source.mp3": ["-c:a", "libmp3lame", "-q:a", "4"],
+    "source.m4a": ["-c:a", "aac", "-b:a", "64k"],
+    "source.ogg": ["-c:a", "libopus", "-b:a", "32k"],
+    "source.wav": ["-c:a", "pcm_s16le"],
+}
+
+
+def probed_duration(path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", str(path)],
+        stdout=subprocess.PIPE, check=True
+    )
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+def decoded_duration(path):
+    """Duración del audio decodificado (lo que recibe la API), sin fiarse de la cabecera"""
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", str(path), "-f", "s16le", "-ac", "1", "-ar", "16000", "pipe:1"],
+        stdout=subprocess.PIPE, check=True
+    )
+    return len(result.stdout) / (2 * 16000)
+
+
+def make_source(tmp_path, name):
+    source = tmp_path / name
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"anoisesrc=d={SOURCE_SEC}:a=0.3",
+         "-ar", "48000", *SOURCES[name], str(source)],
+        check=True
+    )
+    return source
+
+
+def chunk_bytes(audio):
+    return audio.data if audio.in_memory else Path(audio.path).read_bytes()
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+@pytest.mark.parametrize("budget_mb", [100, 0])
+def test_chunk_duration_matches_window(tmp_path, monkeypatch, name, budget_mb):
+    monkeypatch.setattr(Config, "CHUNK_MEMORY_BUDGET_MB", budget_mb)
+    source = make_source(tmp_path, name)
+
+    processor = AudioProcessor(tmp_path, tmp_path, work_dir=str(tmp_path / "work"))
+    (tmp_path / "work").mkdir()
+    chunks = processor._export_windows(source, WINDOWS, skip_indices=())
+
+    for chunk in chunks:
+        audio = chunk["audio"]
+        # Solo flac necesita seek al escribir: el resto se queda en memoria mientras haya presupuesto
+        assert audio.in_memory == (budget_mb > 0 and not audio.name.endswith(".flac")), audio.name
+        if audio.in_memory:
+            chunk_file = tmp_path / f"piped_{audio.name}"
+            chunk_file.write_bytes(audio.data)
+        else:
+            chunk_file = audio.path
+        expected = (chunk["end_ms"] - chunk["start_ms"]) / 1000
+        # Tolerancia de unos frames: la copia de stream corta en fronteras de frame
+        assert decoded_duration(chunk_file) == pytest.approx(expected, abs=0.15), audio.name
+        # mp3 por pipe no lleva cabecera Xing: ffprobe estima la duración por el bitrate (VBR)
+        if not (audio.in_memory and audio.name.endswith(".mp3")):
+            assert probed_duration(chunk_file) == pytest.approx(expected, abs=0.15), audio.name
+
+
+# La caché de transcripciones usa el hash del chunk: el mismo corte debe dar los mismos bytes
+@pytest.mark.parametrize("name, export_format", [("source.ogg", "mp3"), ("source.wav", "opus")])
+@pytest.mark.parametrize("budget_mb", [100, 0])
+def test_ogg_chunk_is_repeatable(tmp_path, monkeypatch, name, export_format, budget_mb):
+    monkeypatch.setattr(Config, "CHUNK_MEMORY_BUDGET_MB", budget_mb)
+    monkeypatch.setattr(Config, "CHUNK_EXPORT_FORMAT", export_format)
+    source = make_source(tmp_path, name)
+
+    exports = []
+    for attempt in range(2):
+        work_dir = tmp_path / f"work{attempt}"
+        work_dir.mkdir()
+        processor = AudioProcessor(tmp_path, tmp_path, work_dir=str(work_dir))
+        audio = processor._export_windows(source, WINDOWS, skip_indices=())[1]["audio"]
+        assert audio.name.endswith(".ogg")
+        exports.append(chunk_bytes(audio))
+    assert exports[0] == exports[1]
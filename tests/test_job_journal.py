@@ -0,0 +1,90 @@
+"""Diario de trabajos reanudables: ida y vuelta a disco y condiciones que lo invalidan"""
+
+import os
+
+import pytest
+
+from audio_processor import AudioProcessor
+from config import Config
+from job_journal import JobJournal
+from pipeline import TranscriptionPipeline
+
+MODEL = "gpt-4o-transcribe-diarize"
+CHUNKS = [
+    {"index": 1, "start_ms": 0, "end_ms": 600000},
+    {"index": 2, "start_ms": 595000, "end_ms": 1200000},
+    {"index": 3, "start_ms": 1195000, "end_ms": 1500000},
+]
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "JOBS_DIR", str(tmp_path / ".jobs"))
+    monkeypatch.setattr(Config, "VAD_ENABLED", False)
+    audio = tmp_path / "entrevista.m4a"
+    audio.write_bytes(b"audio" * 100)
+    return audio
+
+
+@pytest.fixture
+def journal(tmp_path, source):
+    journal = JobJournal(tmp_path / "entrevista_diarization.txt")
+    journal.start(source, MODEL, CHUNKS)
+    journal.mark_done(1, {"segments": [{"speaker": "A", "start": 0.0, "end": 4.0, "text": "hola"}]})
+    journal.mark_done(3, {"segments": []})
+    return journal
+
+
+def test_resume_reloads_windows_and_finished_chunks(tmp_path, source, journal):
+    resumed = JobJournal(tmp_path / "entrevista_diarization.txt")
+    assert resumed.load(source, MODEL)
+    assert resumed.windows == [(0, 600000), (595000, 1200000), (1195000, 1500000)]
+    assert resumed.done_indices() == {1, 3}
+    assert resumed.results() == [journal.results()[0], None, {"segments": []}]
+
+    resumed.finish()
+    assert not JobJournal(tmp_path / "entrevista_diarization.txt").load(source, MODEL)
+
+
+def test_other_model_does_not_resume(tmp_path, source, journal):
+    assert not JobJournal(tmp_path / "entrevista_diarization.txt").load(source, "gpt-4o-transcribe")
+
+
+def test_vad_change_invalidates_plan(tmp_path, source, journal, monkeypatch):
+    # Con VAD las ventanas están en otra línea de tiempo
+    monkeypatch.setattr(Config, "VAD_ENABLED", True)
+    assert not JobJournal(tmp_path / "entrevista_diarization.txt").load(source, MODEL)
+
+
+@pytest.mark.parametrize("change", ["content", "mtime"])
+def test_changed_audio_invalidates_plan(tmp_path, source, journal, change):
+    if change == "content":
+        source.write_bytes(b"audio distinto" * 100)
+    else:
+        stat = source.stat()
+        os.utime(source, (stat.st_atime, stat.st_mtime + 60))
+    assert not JobJournal(tmp_path / "entrevista_diarization.txt").load(source, MODEL)
+
+
+def test_corrupt_journal_is_ignored(tmp_path, source, journal):
+    journal.path.write_text("{ cortado a mitad", encoding="utf-8")
+    assert not JobJournal(tmp_path / "entrevista_diarization.txt").load(source, MODEL)
+
+
+def test_journal_with_another_plan_starts_over(tmp_path, source, journal):
+    # Otro modelo del mismo audio con un plan distinto (p. ej. otra MAX_CHUNK_DURATION_SEC)
+    other = JobJournal(tmp_path / "entrevista_standard.txt")
+    other.start(source, "gpt-4o-transcribe", [{"index": 1, "start_ms": 0, "end_ms": 1500000}])
+    other.mark_done(1, {"text": "todo"})
+
+    targets = [
+        {"model": MODEL, "journal": JobJournal(tmp_path / "entrevista_diarization.txt")},
+        {"model": "gpt-4o-transcribe", "journal": JobJournal(tmp_path / "entrevista_standard.txt")},
+    ]
+    pipeline = TranscriptionPipeline(AudioProcessor(tmp_path, tmp_path), None, [], resume=True)
+    windows, skip = pipeline._resume_plan(source, targets)
+
+    assert windows == journal.windows
+    # El plan compartido es el primero; el diario con otro plan se descarta y nada se omite
+    assert targets[1]["journal"].data is None
+    assert skip == set()
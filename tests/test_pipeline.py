@@ -0,0 +1,31 @@
+"""Cierre del pipeline: los temporales y el pool de decodificación se liberan aunque se interrumpa"""
+
+import pytest
+
+from audio_processor import AudioProcessor
+from config import Config
+from pipeline import _END, TranscriptionPipeline
+
+
+class InterruptedUploader:
+    """Hilo de subida cuya espera se corta con Ctrl+C"""
+
+    def join(self, timeout=None):
+        raise KeyboardInterrupt
+
+
+def test_close_cleans_up_when_interrupted(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SCRATCH_DIR", str(tmp_path / "scratch"))
+    pipeline = TranscriptionPipeline(AudioProcessor(tmp_path, tmp_path), None, [], upload_workers=1)
+    pipeline.start()
+    for thread in pipeline._uploaders:
+        pipeline._pending.put(_END)
+        thread.join()
+    pipeline._uploaders = [InterruptedUploader()]
+
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.close()
+
+    assert not pipeline.scratch.path.exists()
+    with pytest.raises(RuntimeError):
+        pipeline._executor.submit(print)
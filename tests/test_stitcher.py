@@ -0,0 +1,23 @@
+"""Unión de chunks diarizados: sin texto duplicado ni solapamiento de tiempos en la costura"""
+
+from stitcher import stitch_results
+
+
+def test_seam_segments_do_not_overlap_in_time():
+    previous = {"segments": [
+        {"speaker": "A", "start": 0.0, "end": 50.0, "text": "uno dos tres"},
+        {"speaker": "B", "start": 50.0, "end": 60.0, "text": "hola qué tal estás hoy amigo mío"},
+    ]}
+    following = {"segments": [
+        {"speaker": "B", "start": 52.0, "end": 62.0, "text": "tal estás hoy amigo mío bien"},
+        {"speaker": "A", "start": 62.0, "end": 70.0, "text": "sigo"},
+    ]}
+    segments = stitch_results([previous, following], overlap_sec=10)["segments"]
+
+    assert [segment["text"] for segment in segments] == [
+        "uno dos tres", "hola qué", "tal estás hoy amigo mío bien", "sigo"
+    ]
+    for before, after in zip(segments, segments[1:]):
+        assert before["end"] <= after["start"]
+    for segment in segments:
+        assert segment["start"] <= segment["end"]
@@ -0,0 +1,104 @@
+"""Índice FTS5 de transcripciones: filtros de búsqueda y reindexado al reescribir"""
+
+import os
+
+import pytest
+
+from transcript_index import TranscriptIndex, transcript_kind
+
+
+@pytest.fixture
+def outputs(tmp_path):
+    output_dir = tmp_path / "outputs"
+    output_dir.mkdir()
+    (output_dir / "entrevista_diarization.txt").write_text(
+        "[A] (0.0s-5.0s): Bienvenidos al programa de hoy.\n\n"
+        "[B] (5.0s-12.0s): Gracias por la invitación, es un placer.\n\n"
+        "[A] (700.0s-710.0s): Volvemos al programa después de la pausa.\n",
+        encoding='utf-8'
+    )
+    (output_dir / "charla_standard.txt").write_text(
+        "Hoy hablamos del programa de radio. Gracias a todos por venir.",
+        encoding='utf-8'
+    )
+    return output_dir
+
+
+@pytest.fixture
+def index(tmp_path, outputs):
+    index = TranscriptIndex(db_path=tmp_path / "transcripts.db", output_dir=outputs)
+    assert index.sync() == (2, 0)
+    return index
+
+
+def test_transcript_kind():
+    assert transcript_kind("a_diarization_improved.txt") == ("a", "diarization_improved")
+    assert transcript_kind("a_diarization.txt") == ("a", "diarization")
+    assert transcript_kind("a_mini.txt") == ("a", "mini")
+    assert transcript_kind("_standard.txt") is None
+    assert transcript_kind("a_standard.jsonl") is None
+
+
+def test_phrase_matches_both_transcripts(index):
+    results = index.search("programa")
+    assert [(r["base"], r["kind"]) for r in results] == [
+        ("charla", "standard"), ("entrevista", "diarization"), ("entrevista", "diarization")
+    ]
+    assert "«programa»" in results[0]["text"]
+
+
+def test_filters_by_file_kind_and_speaker(index):
+    assert [r["base"] for r in index.search("gracias", base="entrevista")] == ["entrevista"]
+    assert [r["base"] for r in index.search("gracias", kind="standard")] == ["charla"]
+
+    # Speaker sin distinguir mayúsculas; frase sin tildes encuentra "invitación"
+    results = index.search("invitacion", speaker="b")
+    assert [(r["speaker"], r["start"], r["end"]) for r in results] == [("B", 5.0, 12.0)]
+    assert index.search("invitacion", speaker="A") == []
+
+
+def test_time_range_overlaps_and_skips_untimed_passages(index):
+    results = index.search("programa", start_sec=600, end_sec=900)
+    assert [(r["speaker"], r["start"]) for r in results] == [("A", 700.0)]
+
+    # Sin frase: solo filtros; los pasajes de standard no tienen tiempos y quedan fuera
+    results = index.search(start_sec=4, end_sec=6)
+    assert [r["speaker"] for r in results] == ["A", "B"]
+
+
+def test_rewritten_transcript_replaces_old_text(index, outputs):
+    path = outputs / "entrevista_diarization.txt"
+    path.write_text("[A] (0.0s-4.0s): Empezamos con noticias nuevas.\n", encoding='utf-8')
+    os.utime(path, (1, 1))
+
+    assert index.sync() == (1, 0)
+    assert index.search("pausa") == []
+    assert [r["base"] for r in index.search("programa")] == ["charla"]
+    assert [r["start"] for r in index.search("noticias nuevas")] == [0.0]
+
+    # Sin cambios de tamaño ni mtime no se vuelve a leer nada
+    assert index.sync() == (0, 0)
+
+
+def test_index_file_with_segments_in_memory(index, outputs):
+    path = outputs / "entrevista_diarization.txt"
+    segments = [{"speaker": "C", "start": 1.0, "end": 2.0, "text": "Texto guardado de nuevo."}]
+    assert index.index_file(path, segments) == 1
+    assert [r["speaker"] for r in index.search("guardado")] == ["C"]
+    assert index.search("bienvenidos") == []
+
+
+def test_deleted_transcript_and_improvable_bases(index, outputs):
+    (outputs / "entrevista_standard.txt").write_text("Bienvenidos al programa de hoy.", encoding='utf-8')
+    assert index.sync() == (1, 0)
+    assert index.improvable_bases() == ["entrevista"]
+
+    (outputs / "entrevista_diarization_improved.txt").write_text(
+        "[A] (0s-5s): Bienvenidos al programa de hoy.", encoding='utf-8'
+    )
+    index.sync()
+    assert index.improvable_bases() == []
+
+    (outputs / "charla_standard.txt").unlink()
+    assert index.sync() == (0, 1)
+    assert all(r["base"] != "charla" for r in index.search("gracias"))
@@ -0,0 +1,61 @@
+"""Caché de transcripciones: clave estable por contenido y expulsión LRU por tamaño"""
+
+import itertools
+
+import pytest
+
+import transcription_cache
+from scratch import AudioBuffer
+from transcription_cache import TranscriptionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj determinista: cada lectura avanza un segundo"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(transcription_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_key_depends_on_content_model_and_format(tmp_path):
+    cache = TranscriptionCache(tmp_path / "cache.db")
+    first = tmp_path / "a.mp3"
+    copy = tmp_path / "copia con otro nombre.mp3"
+    other = tmp_path / "b.mp3"
+    first.write_bytes(b"audio" * 1000)
+    copy.write_bytes(b"audio" * 1000)
+    other.write_bytes(b"otro audio" * 1000)
+
+    key = cache.make_key(first, "gpt-4o-transcribe", "json")
+    assert cache.make_key(first, "gpt-4o-transcribe", "json") == key
+    assert cache.make_key(copy, "gpt-4o-transcribe", "json") == key
+    # El mismo chunk en memoria (pipe de ffmpeg) y en disco comparte la entrada
+    assert cache.make_key(AudioBuffer("chunk_001.mp3", data=b"audio" * 1000), "gpt-4o-transcribe", "json") == key
+
+    assert cache.make_key(first, "gpt-4o-mini-transcribe", "json") != key
+    assert cache.make_key(first, "gpt-4o-transcribe", "diarized_json") != key
+    assert cache.make_key(other, "gpt-4o-transcribe", "json") != key
+
+
+def test_round_trip(tmp_path):
+    cache = TranscriptionCache(tmp_path / "cache.db")
+    key = cache.make_key(AudioBuffer("c.mp3", data=b"x"), "gpt-4o-transcribe-diarize", "diarized_json")
+    result = {"segments": [{"speaker": "A", "start": 0.0, "end": 1.5, "text": "¿qué tal?"}]}
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert TranscriptionCache(tmp_path / "cache.db").get(key) == result
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    payload = {"text": "x" * 1000}
+    # Caben dos entradas, no tres
+    cache = TranscriptionCache(tmp_path / "cache.db", max_size_mb=2500 / (1024 * 1024))
+    keys = [cache.make_key(AudioBuffer("c.mp3", data=bytes([i])), "m", "json") for i in range(3)]
+
+    cache.put(keys[0], payload)
+    cache.put(keys[1], payload)
+    assert cache.get(keys[0]) == payload  # la primera pasa a ser la más reciente
+    cache.put(keys[2], payload)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == payload
+    assert cache.get(keys[2]) == payload
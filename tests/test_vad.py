@@ -0,0 +1,79 @@
+"""Recorte de pausas (VAD): regiones de voz y vuelta de los timestamps a la grabación original"""
+
+import numpy as np
+import pytest
+
+from silence_detector import speech_regions
+from stitcher import OffsetMap
+
+FRAME_MS = 10
+SPEECH_DB = -20.0
+SILENCE_DB = -80.0
+
+# Regiones conservadas (ms) de una grabación de 60 s: se quitaron 10-20 s, 30-45 s y 50-60 s
+REGIONS = [(0, 10000), (20000, 30000), (45000, 50000)]
+REMOVED = [(10.0, 20.0), (30.0, 45.0), (50.0, 60.0)]
+
+
+def envelope(*parts):
+    """Envolvente a partir de tramos (voz?, segundos)"""
+    return np.concatenate([
+        np.full(int(seconds * 1000 / FRAME_MS), SPEECH_DB if speech else SILENCE_DB) for speech, seconds in parts
+    ])
+
+
+@pytest.mark.parametrize("parts, expected", [
+    # Pausa larga interior: se conserva medio segundo a cada lado; la pausa corta se queda
+    ([(True, 1), (False, 4), (True, 1), (False, 0.5), (True, 1), (False, 3)], [(0, 1500), (4500, 8000)]),
+    # Silencio al principio: se quita entero salvo el margen junto a la voz
+    ([(False, 4), (True, 1)], [(3500, 5000)]),
+    # Sin pausas largas: todo se conserva
+    ([(True, 2), (False, 1), (True, 2)], [(0, 5000)]),
+    ([], []),
+])
+def test_speech_regions(parts, expected):
+    env = envelope(*parts) if parts else np.array([])
+    assert speech_regions(env, FRAME_MS, min_silence_ms=3000, keep_silence_ms=1000, margin_db=10) == expected
+
+
+@pytest.mark.parametrize("trimmed_sec, is_end, original_sec", [
+    (0.0, False, 0.0),
+    (5.0, False, 5.0),
+    # Justo en un corte: un inicio pasa a la región siguiente, un final se queda en la anterior
+    (10.0, False, 20.0),
+    (10.0, True, 10.0),
+    (15.0, False, 25.0),
+    # Tras varios cortes se acumula todo lo quitado antes
+    (20.0, False, 45.0),
+    (20.0, True, 30.0),
+    (22.5, False, 47.5),
+    (25.0, True, 50.0),
+    # Más allá del audio recortado: el final de la última región
+    (30.0, False, 50.0),
+])
+def test_to_original(trimmed_sec, is_end, original_sec):
+    offset_map = OffsetMap(REGIONS, original_ms=60000)
+    assert offset_map.to_original(trimmed_sec, is_end=is_end) == pytest.approx(original_sec)
+
+
+def test_no_time_lands_inside_a_removed_pause():
+    offset_map = OffsetMap(REGIONS, original_ms=60000)
+    for trimmed_sec in np.arange(0, 25.01, 0.25):
+        for is_end in (False, True):
+            original = offset_map.to_original(trimmed_sec, is_end=is_end)
+            assert not any(start < original < end for start, end in REMOVED), (trimmed_sec, original)
+
+
+def test_remap_result_and_durations():
+    offset_map = OffsetMap(REGIONS, original_ms=60000)
+    assert (offset_map.trimmed_ms, offset_map.original_ms, offset_map.removed_ms) == (25000, 60000, 35000)
+
+    result = {"segments": [
+        {"speaker": "A", "start": 8.0, "end": 12.0, "text": "cruza el primer corte"},
+        {"speaker": "B", "start": 12.0, "end": 20.0, "text": "termina en el segundo"},
+    ]}
+    remapped = offset_map.remap_result(result)["segments"]
+    assert [(s["start"], s["end"]) for s in remapped] == [(8.0, 22.0), (22.0, 30.0)]
+    assert [s["text"] for s in remapped] == [s["text"] for s in result["segments"]]
+    # Texto plano: sin timestamps que mover
+    assert offset_map.remap_result({"text": "hola"}) == {"text": "hola"}
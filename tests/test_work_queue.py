@@ -0,0 +1,82 @@
+"""
+Cola compartida entre workers: leases, traspaso a otro worker y límite de intentos.
+Dos manejadores sobre la misma base de datos hacen de dos workers (procesos u hosts distintos)
+"""
+
+import time
+
+import pytest
+
+from config import Config
+from work_queue import WorkQueue
+
+LEASE_SEC = 0.2
+
+
+@pytest.fixture
+def queues(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "WORKER_LEASE_SEC", LEASE_SEC)
+    monkeypatch.setattr(Config, "WATCH_MAX_ATTEMPTS", 2)
+    db_path = tmp_path / "queue.db"
+    return WorkQueue(db_path, worker_id="host-a:1"), WorkQueue(db_path, worker_id="host-b:1")
+
+
+def expire_lease():
+    time.sleep(LEASE_SEC * 1.5)
+
+
+def test_claimed_file_is_not_claimed_twice(queues):
+    first, second = queues
+    first.enqueue("/audio/a.m4a", 10, 1.0)
+    assert [entry["path"] for entry in first.claim()] == ["/audio/a.m4a"]
+    assert second.claim() == []
+
+
+def test_expired_lease_is_handed_to_another_worker(queues):
+    first, second = queues
+    first.enqueue("/audio/a.m4a", 10, 1.0)
+    entry = first.claim()[0]
+
+    expire_lease()
+    taken = second.claim()
+    assert [e["path"] for e in taken] == ["/audio/a.m4a"]
+
+    # El worker original ya no tiene el lease: su resultado no pisa al del nuevo dueño
+    first.finish(entry)
+    assert second.counts() == {WorkQueue.STATUS_PROCESSING: 1}
+    second.finish(taken[0])
+    assert second.counts() == {WorkQueue.STATUS_DONE: 1}
+
+
+def test_renewed_lease_is_kept(queues):
+    first, second = queues
+    first.enqueue("/audio/a.m4a", 10, 1.0)
+    entry = first.claim()[0]
+    for _ in range(3):
+        time.sleep(LEASE_SEC / 2)
+        first.renew([entry])
+    assert second.claim() == []
+    first.finish(entry)
+    assert first.counts() == {WorkQueue.STATUS_DONE: 1}
+
+
+def test_expired_leases_stop_after_max_attempts(queues):
+    first, second = queues
+    first.enqueue("/audio/a.m4a", 10, 1.0)
+    assert first.claim()
+    expire_lease()
+    assert second.claim()  # segundo intento (WATCH_MAX_ATTEMPTS = 2)
+    expire_lease()
+    assert first.claim() == []
+    assert first.counts() == {WorkQueue.STATUS_FAILED: 1}
+
+
+def test_failed_file_is_retried_until_max_attempts(queues, monkeypatch):
+    monkeypatch.setattr(Config, "WATCH_RETRY_DELAY_SEC", 0)
+    first, second = queues
+    first.enqueue("/audio/a.m4a", 10, 1.0)
+    first.finish(first.claim()[0], error=RuntimeError("429"))
+    entry = second.claim()[0]
+    second.finish(entry, error=RuntimeError("429"))
+    assert first.claim() == []
+    assert first.counts() == {WorkQueue.STATUS_FAILED: 1}